@@ -0,0 +1,276 @@
+"""
+Content Hasher Module
+Parallel file digests with a (device, inode, size, mtime) keyed cache
+"""
+
+import os
+import json
+import mmap
+import fnmatch
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, Optional, Tuple
+from pathlib import Path
+
+from instrumentation import Timings, NULL_TIMINGS
+from resource_governor import get_governor, bounded_map
+
+logger = logging.getLogger(__name__)
+
+
+def walk_files(root: Path) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield (relative path, stat) for regular files under root, not following symlinks
+    
+    The walk is depth-first in name order, so repeated walks of an unchanged
+    tree produce the same sequence.
+    """
+    stack = ['']
+    while stack:
+        relative_dir = stack.pop()
+        try:
+            with os.scandir(root / relative_dir) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"Skipping unreadable directory {root / relative_dir}: {str(e)}")
+            continue
+        subdirs = []
+        for entry in entries:
+            relative = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(relative)
+                elif entry.is_file(follow_symlinks=False):
+                    yield relative, entry.stat(follow_symlinks=False)
+            except OSError as e:
+                logger.warning(f"Skipping unreadable entry {entry.path}: {str(e)}")
+        stack.extend(reversed(subdirs))
+
+
+class DigestCache:
+    """Thread-safe digest cache keyed by device, inode, size, mtime and algorithm
+    
+    A file whose identity and metadata are unchanged is assumed to have
+    unchanged contents, so its digest is served without reading it. With a
+    ``cache_path`` entries are loaded from and saved to a JSON file, making
+    the cache survive between agent invocations.
+    """
+    
+    MAX_ENTRIES = 200000
+    ENVIRONMENT_VARIABLE = 'RRV_AGENT_HASH_CACHE'
+    # Per-user file, since each agent invocation is a new process
+    DEFAULT_PATH = os.path.join(tempfile.gettempdir(),
+                                f"rrv-agent-digests-{os.getuid() if hasattr(os, 'getuid') else 0}.json")
+    DISABLED = 'none'
+    
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._dirty = False
+        if cache_path and os.path.exists(cache_path):
+            self._load()
+    
+    @classmethod
+    def resolve_path(cls, cache_path: Optional[str] = None) -> Optional[str]:
+        """Cache file to use: cache_path, else RRV_AGENT_HASH_CACHE, else DEFAULT_PATH; 'none' keeps it in memory"""
+        cache_path = cache_path or os.environ.get(cls.ENVIRONMENT_VARIABLE) or cls.DEFAULT_PATH
+        return None if cache_path.lower() == cls.DISABLED else cache_path
+    
+    @staticmethod
+    def key(stat_info: os.stat_result, hash_algorithm: str) -> str:
+        return (f"{stat_info.st_dev}:{stat_info.st_ino}:{stat_info.st_size}:"
+                f"{stat_info.st_mtime_ns}:{hash_algorithm}")
+    
+    def get(self, stat_info: os.stat_result, hash_algorithm: str) -> Optional[str]:
+        key = self.key(stat_info, hash_algorithm)
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+            return digest
+    
+    def put(self, stat_info: os.stat_result, hash_algorithm: str, digest: str) -> None:
+        key = self.key(stat_info, hash_algorithm)
+        with self._lock:
+            self._entries[key] = digest
+            self._entries.move_to_end(key)
+            # Evict least recently used entries beyond the bound
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+            self._dirty = True
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def save(self) -> None:
+        """Atomically write the cache file if entries changed since loading"""
+        if not self.cache_path or not self._dirty:
+            return
+        with self._lock:
+            snapshot = dict(self._entries)
+            self._dirty = False
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'version': 1, 'entries': snapshot}, f, separators=(',', ':'))
+        os.replace(temp_path, self.cache_path)
+    
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path, 'r') as f:
+                # A file planted by another user could serve forged digests
+                if hasattr(os, 'getuid') and os.fstat(f.fileno()).st_uid != os.getuid():
+                    raise ValueError("owned by another user")
+                data = json.load(f)
+            self._entries.update(data.get('entries', {}))
+        except (OSError, ValueError) as e:
+            # A corrupt or unreadable cache only costs a re-read
+            logger.warning(f"Ignoring digest cache {self.cache_path}: {str(e)}")
+
+
+# Process-wide cache used when no cache file is configured
+DIGEST_CACHE = DigestCache()
+
+
+class ContentHasher:
+    """Computes file digests in a thread pool, serving unchanged files from a DigestCache
+    
+    hashlib releases the GIL while digesting large buffers, so worker threads
+    hash files in parallel. Files up to ``MMAP_THRESHOLD`` are read into a
+    reused per-thread buffer; larger files are memory-mapped and digested in
+    place without copying.
+    """
+    
+    HASH_ALGORITHMS = ('blake2b', 'sha256', 'sha1', 'md5')
+    DEFAULT_HASH_ALGORITHM = 'blake2b'
+    CHUNK_SIZE = 1024 * 1024
+    MMAP_THRESHOLD = 8 * 1024 * 1024
+    MMAP_CHUNK_SIZE = 16 * 1024 * 1024
+    
+    def __init__(self, max_workers: Optional[int] = None, cache: Optional[DigestCache] = None,
+                 timings: Optional[Timings] = None):
+        self.max_workers = get_governor().pool_size(max_workers, per_cpu=2)
+        self.cache = cache if cache is not None else DIGEST_CACHE
+        self.timings = timings or NULL_TIMINGS
+        self._local = threading.local()
+    
+    def hash_paths(self, path: str, hash_algorithm: Optional[str] = None,
+                   pattern: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a digest record for a file, or for every file under a directory
+        
+        Records (path relative to a directory root, size, hash and whether
+        the digest came from the cache) are yielded in walk order while up to
+        ``2 * max_workers`` files are hashed ahead. Unreadable files produce a
+        record with ``error``. A closing ``summary`` record follows.
+        """
+        hash_algorithm = hash_algorithm or self.DEFAULT_HASH_ALGORITHM
+        self._check_algorithm(hash_algorithm)
+        target = Path(path)
+        if not target.exists():
+            raise FileNotFoundError(f"Path not found: {path}")
+        
+        if target.is_dir():
+            root = target
+            files = walk_files(root)
+        else:
+            root = target.parent
+            files = iter([(target.name, target.stat())])
+        if pattern:
+            files = ((relative, stat_info) for relative, stat_info in files
+                     if fnmatch.fnmatch(os.path.basename(relative), pattern))
+        
+        summary = {'type': 'summary', 'hash_algorithm': hash_algorithm, 'files': 0, 'bytes': 0,
+                   'bytes_read': 0, 'cache_hits': 0, 'errors': 0}
+        
+        def finish(record: Dict[str, Any]) -> Dict[str, Any]:
+            summary['files'] += 1
+            summary['bytes'] += record['size']
+            if 'error' in record:
+                summary['errors'] += 1
+            elif record['cached']:
+                summary['cache_hits'] += 1
+            else:
+                summary['bytes_read'] += record['size']
+            return record
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                def submit(item: Tuple[str, os.stat_result]):
+                    relative, stat_info = item
+                    return executor.submit(self._hash_record, root / relative, relative, stat_info, hash_algorithm)
+                
+                for _, record in bounded_map(submit, files, self.max_workers * 2):
+                    yield finish(record)
+        finally:
+            self.cache.save()
+        
+        self.timings.count('bytes_read', summary['bytes_read'])
+        self.timings.count('cache_hits', summary['cache_hits'])
+        yield summary
+    
+    def hash_file(self, path: Path, hash_algorithm: str,
+                  stat_info: Optional[os.stat_result] = None) -> Tuple[str, bool]:
+        """Return (digest, served from cache) for one file"""
+        self._check_algorithm(hash_algorithm)
+        if stat_info is None:
+            stat_info = os.stat(path)
+        digest = self.cache.get(stat_info, hash_algorithm)
+        if digest is not None:
+            return digest, True
+        
+        digest = self._digest(path, hash_algorithm, stat_info.st_size)
+        # Only cache the digest if the file was not modified while being read
+        after = os.stat(path)
+        if after.st_mtime_ns == stat_info.st_mtime_ns and after.st_size == stat_info.st_size:
+            self.cache.put(stat_info, hash_algorithm, digest)
+        return digest, False
+    
+    def _hash_record(self, path: Path, relative: str, stat_info: os.stat_result,
+                     hash_algorithm: str) -> Dict[str, Any]:
+        """Digest record for one file, recording read errors instead of raising"""
+        record = {'type': 'file', 'path': relative, 'size': stat_info.st_size}
+        try:
+            record['hash'], record['cached'] = self.hash_file(path, hash_algorithm, stat_info)
+        except OSError as e:
+            record['error'] = str(e)
+        return record
+    
+    def _digest(self, path: Path, hash_algorithm: str, size: int) -> str:
+        digest = hashlib.new(hash_algorithm)
+        governor = get_governor()
+        with open(path, 'rb', buffering=0) as f:
+            if size >= self.MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if hasattr(mapped, 'madvise'):
+                        mapped.madvise(mmap.MADV_SEQUENTIAL)
+                    view = memoryview(mapped)
+                    try:
+                        for offset in range(0, len(mapped), self.MMAP_CHUNK_SIZE):
+                            governor.throttle_read(min(self.MMAP_CHUNK_SIZE, len(mapped) - offset))
+                            digest.update(view[offset:offset + self.MMAP_CHUNK_SIZE])
+                    finally:
+                        view.release()
+            else:
+                buffer = self._buffer()
+                view = memoryview(buffer)
+                while True:
+                    read = f.readinto(buffer)
+                    if not read:
+                        break
+                    governor.throttle_read(read)
+                    digest.update(view[:read])
+        return digest.hexdigest()
+    
+    def _buffer(self) -> bytearray:
+        """Read buffer reused by every file hashed on the current thread"""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = bytearray(self.CHUNK_SIZE)
+        return buffer
+    
+    def _check_algorithm(self, hash_algorithm: str) -> None:
+        if hash_algorithm not in self.HASH_ALGORITHMS:
+            raise ValueError(f"Unknown hash algorithm: {hash_algorithm}")
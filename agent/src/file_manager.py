@@ -4,10 +4,74 @@ Handles file system operations and metadata extraction
 """
 
 import os
+import re
+import math
 import stat
-from typing import Dict, List, Any
+import heapq
+import fnmatch
+from collections import deque
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Callable, Tuple
 from pathlib import Path
 
+from instrumentation import NULL_TIMINGS
+
+
+class _ListingEntry:
+    """Compact record of a scanned directory entry (at most one stat, no dict per entry)
+    
+    Entries created with ``stated=False`` only know their name and type;
+    ``stat_in`` fills in the rest once the entry is actually needed.
+    """
+    
+    __slots__ = ('name', 'is_dir', 'size', 'modified', 'mode', 'error', 'stated')
+    
+    def __init__(self, name: str, is_dir: bool, size: int = 0, modified: float = 0.0,
+                 mode: int = 0, error: Optional[str] = None, stated: bool = True):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.modified = modified
+        self.mode = mode
+        self.error = error
+        self.stated = stated
+    
+    @classmethod
+    def from_stat(cls, name: str, stat_info: os.stat_result) -> '_ListingEntry':
+        """Create a record from a stat result"""
+        return cls(name, stat.S_ISDIR(stat_info.st_mode), stat_info.st_size,
+                   stat_info.st_mtime, stat_info.st_mode)
+    
+    @classmethod
+    def from_dir_entry(cls, entry: os.DirEntry) -> '_ListingEntry':
+        """Create a record from an os.scandir entry, keeping stat errors"""
+        try:
+            return cls.from_stat(entry.name, entry.stat())
+        except OSError as e:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            return cls(entry.name, is_dir, error=str(e))
+    
+    def stat_in(self, parent: Path) -> '_ListingEntry':
+        """Return this entry stat'ed, statting it under parent if the scan skipped it"""
+        if self.stated:
+            return self
+        try:
+            return self.from_stat(self.name, os.stat(parent / self.name))
+        except OSError as e:
+            return _ListingEntry(self.name, self.is_dir, error=str(e))
+    
+    @property
+    def is_regular_file(self) -> bool:
+        """Whether the entry was stat'ed successfully and is a regular file"""
+        return self.error is None and stat.S_ISREG(self.mode)
+    
+    @property
+    def extension(self) -> str:
+        """Lower-cased file extension including the dot"""
+        return os.path.splitext(self.name)[1].lower()
+
 
 class FileManager:
     """Manages file system operations"""
@@ -16,8 +80,23 @@ class FileManager:
         '.jpg', '.jpeg', '.png', '.gif', '.webp', '.raw', '.bmp', '.tiff'
     }
     
-    def list_directory(self, directory_path: str) -> Dict[str, Any]:
-        """List directory contents with file information"""
+    SORT_KEYS = ('name', 'natural', 'size', 'modified')
+    OUTPUT_FORMATS = ('full', 'compact')
+    COMPACT_COLUMNS = ('name', 'type', 'size', 'modified', 'permissions', 'extension', 'raw')
+    
+    def __init__(self, timings=None):
+        # Phases: scan (scandir, stat and filters; includes the heap selection
+        # when paginating), sort, build; metadata uses stat and build
+        self.timings = timings if timings is not None else NULL_TIMINGS
+    
+    def list_directory(self, directory_path: str, sort_by: str = 'name', reverse: bool = False,
+                       pattern: Optional[str] = None, regex: Optional[str] = None,
+                       extensions: Optional[Iterable[str]] = None,
+                       min_size: Optional[int] = None, max_size: Optional[int] = None,
+                       modified_after: Optional[float] = None, modified_before: Optional[float] = None,
+                       valid_raw_only: bool = False, offset: int = 0,
+                       limit: Optional[int] = None, output_format: str = 'full') -> Dict[str, Any]:
+        """List directory contents with file information, filtered, sorted and paged while scanning"""
         try:
             path = Path(directory_path)
             if not path.exists():
@@ -26,15 +105,86 @@ class FileManager:
             if not path.is_dir():
                 raise NotADirectoryError(f"Path is not a directory: {directory_path}")
             
-            items = []
-            for item in path.iterdir():
-                item_info = self._get_item_info(item)
-                items.append(item_info)
+            if sort_by not in self.SORT_KEYS:
+                raise ValueError(f"Unknown sort key: {sort_by}")
+            if offset < 0 or (limit is not None and limit < 0):
+                raise ValueError("offset and limit must be non-negative")
+            if output_format not in self.OUTPUT_FORMATS:
+                raise ValueError(f"Unknown output format: {output_format}")
             
-            return {
-                'path': str(path.absolute()),
-                'items': sorted(items, key=lambda x: (x['type'] != 'directory', x['name'].lower()))
-            }
+            name_matches, stat_matches, stat_filter = self._build_filter(
+                pattern, regex, extensions, min_size, max_size, modified_after, modified_before,
+                valid_raw_only)
+            needs_stat = stat_filter or sort_by in ('size', 'modified')
+            sort_key = self._sort_key(sort_by)
+            
+            directories = []
+            total = 0
+            scanned = 0
+            
+            def scan_files() -> Iterator[_ListingEntry]:
+                nonlocal total, scanned
+                with os.scandir(path) as it:
+                    for dir_entry in it:
+                        scanned += 1
+                        try:
+                            is_dir = dir_entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if not name_matches(dir_entry.name, is_dir):
+                            continue
+                        if needs_stat:
+                            entry = _ListingEntry.from_dir_entry(dir_entry)
+                            if not stat_matches(entry):
+                                continue
+                        else:
+                            entry = _ListingEntry(dir_entry.name, is_dir, stated=False)
+                        total += 1
+                        if entry.is_dir:
+                            directories.append(entry)
+                        else:
+                            yield entry
+            
+            if limit is None:
+                with self.timings.span('scan'):
+                    files = list(scan_files())
+                with self.timings.span('sort'):
+                    files.sort(key=sort_key, reverse=reverse)
+                    directories.sort(key=sort_key, reverse=reverse)
+                page = (directories + files)[offset:]
+            else:
+                # Files are the bulk of large capture directories; keep only the
+                # first offset + limit of them in a heap while scanning.
+                select = heapq.nlargest if reverse else heapq.nsmallest
+                with self.timings.span('scan'):
+                    if offset + limit:
+                        files = select(offset + limit, scan_files(), key=sort_key)
+                    else:
+                        # A zero-size heap never pulls from the scan; drain it for the totals
+                        files = []
+                        deque(scan_files(), maxlen=0)
+                with self.timings.span('sort'):
+                    directories.sort(key=sort_key, reverse=reverse)
+                page = (directories + files)[offset:offset + limit]
+            self.timings.count('entries_scanned', scanned)
+            
+            parent = path.absolute()
+            with self.timings.span('build'):
+                if not needs_stat:
+                    page = [entry.stat_in(parent) for entry in page]
+                    self.timings.count('entries_stated', len(page))
+                if output_format == 'compact':
+                    result = self._compact_listing(parent, page)
+                else:
+                    result = {
+                        'path': str(parent),
+                        'items': [self._build_item_info(parent / entry.name, entry) for entry in page]
+                    }
+            result['total'] = total
+            if limit is not None:
+                result['offset'] = offset
+                result['limit'] = limit
+            return result
             
         except Exception as e:
             raise Exception(f"Failed to list directory: {str(e)}")
@@ -43,74 +193,184 @@ class FileManager:
         """Get file metadata"""
         try:
             path = Path(file_path)
-            if not path.exists():
-                raise FileNotFoundError(f"File not found: {file_path}")
+            with self.timings.span('stat'):
+                try:
+                    entry = _ListingEntry.from_stat(path.name, path.stat())
+                except FileNotFoundError:
+                    raise FileNotFoundError(f"File not found: {file_path}")
+                except OSError as e:
+                    entry = _ListingEntry(path.name, False, error=str(e))
             
-            return self._get_item_info(path)
+            with self.timings.span('build'):
+                return self._build_item_info(path, entry)
             
         except Exception as e:
             raise Exception(f"Failed to get metadata: {str(e)}")
     
-    def _get_item_info(self, path: Path) -> Dict[str, Any]:
-        """Get detailed information about a file or directory"""
-        try:
-            stat_info = path.stat()
-            
-            item_info = {
-                'name': path.name,
+    def _build_item_info(self, path: Path, entry: _ListingEntry) -> Dict[str, Any]:
+        """Build the item record for a scanned entry without another stat"""
+        if entry.error is not None:
+            return {
+                'name': entry.name,
                 'path': str(path.absolute()),
-                'type': 'directory' if path.is_dir() else 'file',
-                'size': stat_info.st_size,
-                'modified': stat_info.st_mtime,
-                'permissions': stat.filemode(stat_info.st_mode)
+                'error': entry.error
             }
+        
+        item_info = {
+            'name': entry.name,
+            'path': str(path.absolute()),
+            'type': 'directory' if entry.is_dir else 'file',
+            'size': entry.size,
+            'modified': entry.modified,
+            'permissions': stat.filemode(entry.mode)
+        }
+        
+        if entry.is_regular_file:
+            item_info['extension'] = entry.extension
+            item_info['is_image'] = entry.extension in self.SUPPORTED_IMAGE_EXTENSIONS
             
-            if path.is_file():
-                item_info['extension'] = path.suffix.lower()
-                item_info['is_image'] = self._is_supported_image(path)
-                
-                # Special handling for RAW files
-                if self._is_raw_file(path):
-                    item_info['raw_info'] = self._analyze_raw_file(path)
-            
-            return item_info
+            # Special handling for RAW files
+            if entry.extension == '.raw':
+                item_info['raw_info'] = self._analyze_raw_file(path, entry.size)
+        
+        return item_info
+    
+    def _compact_listing(self, parent: Path, entries: List[_ListingEntry]) -> Dict[str, Any]:
+        """Build a columnar listing (one array per COMPACT_COLUMNS entry) for a page of entries"""
+        extension_index: Dict[str, int] = {}
+        permission_index: Dict[int, int] = {}
+        columns: Dict[str, List[Any]] = {column: [] for column in self.COMPACT_COLUMNS}
+        
+        for entry in entries:
+            columns['name'].append(entry.name)
+            columns['size'].append(entry.size)
+            columns['modified'].append(entry.modified)
+            if entry.error is not None:
+                columns['type'].append('e')
+                columns['permissions'].append(-1)
+            else:
+                columns['type'].append('d' if entry.is_dir else 'f' if entry.is_regular_file else 'o')
+                columns['permissions'].append(permission_index.setdefault(entry.mode, len(permission_index)))
             
-        except Exception as e:
-            return {
-                'name': path.name,
-                'path': str(path.absolute()),
-                'error': str(e)
-            }
+            raw = None
+            if entry.is_regular_file:
+                extension = entry.extension
+                columns['extension'].append(extension_index.setdefault(extension, len(extension_index)))
+                if extension == '.raw':
+                    width, height = self._raw_dimensions(entry.size)
+                    if width is not None:
+                        raw = [width, height]
+            else:
+                columns['extension'].append(-1)
+            columns['raw'].append(raw)
+        
+        return {
+            'path': str(parent),
+            'format': 'compact',
+            'columns': columns,
+            'count': len(entries),
+            'extension_table': list(extension_index),
+            'permission_table': [stat.filemode(mode) for mode in permission_index],
+            'image_extensions': sorted(self.SUPPORTED_IMAGE_EXTENSIONS)
+        }
+    
+    def _build_filter(self, pattern: Optional[str], regex: Optional[str],
+                      extensions: Optional[Iterable[str]],
+                      min_size: Optional[int], max_size: Optional[int],
+                      modified_after: Optional[float], modified_before: Optional[float],
+                      valid_raw_only: bool) -> Tuple[Callable[[str, bool], bool],
+                                                     Callable[[_ListingEntry], bool], bool]:
+        """Build the listing filter predicates
+        
+        Returns a predicate over (name, is_dir) that needs no stat, a
+        predicate over stat'ed entries, and whether any filter needs the stat.
+        """
+        glob_re = re.compile(fnmatch.translate(pattern), re.IGNORECASE) if pattern else None
+        name_re = re.compile(regex) if regex else None
+        ext_set = None
+        if extensions is not None:
+            ext_set = {ext.lower() if ext.startswith('.') else f'.{ext.lower()}'
+                       for ext in extensions if ext}
+        file_filter = (ext_set is not None or min_size is not None or max_size is not None
+                       or valid_raw_only)
+        stat_filter = (min_size is not None or max_size is not None or valid_raw_only
+                       or modified_after is not None or modified_before is not None)
+        
+        def name_matches(name: str, is_dir: bool) -> bool:
+            if glob_re is not None and not glob_re.match(name):
+                return False
+            if name_re is not None and not name_re.search(name):
+                return False
+            if is_dir and file_filter:
+                return False
+            if ext_set is not None and os.path.splitext(name)[1].lower() not in ext_set:
+                return False
+            return True
+        
+        def stat_matches(entry: _ListingEntry) -> bool:
+            if entry.is_dir and file_filter:
+                return False
+            if entry.error is not None:
+                return not file_filter and modified_after is None and modified_before is None
+            if modified_after is not None and entry.modified < modified_after:
+                return False
+            if modified_before is not None and entry.modified > modified_before:
+                return False
+            if min_size is not None and entry.size < min_size:
+                return False
+            if max_size is not None and entry.size > max_size:
+                return False
+            if valid_raw_only and not (entry.extension == '.raw'
+                                       and self._is_valid_raw_size(entry.size)):
+                return False
+            return True
+        
+        return name_matches, stat_matches, stat_filter
+    
+    def _sort_key(self, sort_by: str) -> Callable[[_ListingEntry], tuple]:
+        """Get the sort key function for scanned entries"""
+        if sort_by == 'natural':
+            return lambda entry: (self._natural_key(entry.name), entry.name)
+        if sort_by == 'size':
+            return lambda entry: (entry.size, entry.name.lower(), entry.name)
+        if sort_by == 'modified':
+            return lambda entry: (entry.modified, entry.name.lower(), entry.name)
+        return lambda entry: (entry.name.lower(), entry.name)
+    
+    @staticmethod
+    def _natural_key(name: str) -> tuple:
+        """Split a name into text and integer runs (frame_2 sorts before frame_10)"""
+        parts = re.split(r'(\d+)', name.lower())
+        return tuple(int(part) if index % 2 else part for index, part in enumerate(parts))
     
     def _is_supported_image(self, path: Path) -> bool:
         """Check if file is a supported image format"""
         return path.suffix.lower() in self.SUPPORTED_IMAGE_EXTENSIONS
     
-    def _is_raw_file(self, path: Path) -> bool:
-        """Check if file is a RAW image file"""
-        return path.suffix.lower() == '.raw'
+    def _raw_dimensions(self, file_size: int) -> tuple:
+        """Determine RAW dimensions from file size, or (None, None) if unknown"""
+        if file_size == 327680:
+            return 640, 512
+        sqrt_size = math.isqrt(file_size)
+        if sqrt_size * sqrt_size == file_size:
+            return sqrt_size, sqrt_size
+        return None, None
     
-    def _analyze_raw_file(self, path: Path) -> Dict[str, Any]:
+    def _is_valid_raw_size(self, file_size: int) -> bool:
+        """Check if a RAW file size maps to known dimensions"""
+        return self._raw_dimensions(file_size)[0] is not None
+    
+    def _analyze_raw_file(self, path: Path, file_size: Optional[int] = None) -> Dict[str, Any]:
         """Analyze RAW file to determine dimensions"""
         try:
-            file_size = path.stat().st_size
-            
-            # Check for 327,680 bytes (640x512)
-            if file_size == 327680:
-                return {
-                    'width': 640,
-                    'height': 512,
-                    'type': 'grayscale',
-                    'valid': True
-                }
+            if file_size is None:
+                file_size = path.stat().st_size
             
-            # Check for perfect square
-            import math
-            sqrt_size = int(math.sqrt(file_size))
-            if sqrt_size * sqrt_size == file_size:
+            width, height = self._raw_dimensions(file_size)
+            if width is not None:
                 return {
-                    'width': sqrt_size,
-                    'height': sqrt_size,
+                    'width': width,
+                    'height': height,
                     'type': 'grayscale',
                     'valid': True
                 }
@@ -124,4 +384,4 @@ class FileManager:
             return {
                 'valid': False,
                 'reason': f'Error analyzing RAW file: {str(e)}'
-            }
\ No newline at end of file
+            }
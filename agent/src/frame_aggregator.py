@@ -0,0 +1,287 @@
+"""
+Frame Aggregator Module
+Computes temporal statistics (mean, max, min, std) over stacks of RAW frames
+"""
+
+import io
+import os
+import base64
+import fnmatch
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+from image_processor import ImageProcessor
+from file_manager import FileManager
+from shm_pool import SharedBufferPool, attach_slab
+from resource_governor import get_governor, init_worker, bounded_map
+
+logger = logging.getLogger(__name__)
+
+
+def _accumulator_views(buffer, shape: Tuple[int, int]) -> Dict[str, np.ndarray]:
+    """Lay the sum, sum_sq (float64), min and max (uint8) accumulators over one buffer"""
+    pixels = shape[0] * shape[1]
+    offsets = {'sum': 0, 'sum_sq': pixels * 8, 'min': pixels * 16, 'max': pixels * 17}
+    return {
+        'sum': np.ndarray(shape, dtype=np.float64, buffer=buffer, offset=offsets['sum']),
+        'sum_sq': np.ndarray(shape, dtype=np.float64, buffer=buffer, offset=offsets['sum_sq']),
+        'min': np.ndarray(shape, dtype=np.uint8, buffer=buffer, offset=offsets['min']),
+        'max': np.ndarray(shape, dtype=np.uint8, buffer=buffer, offset=offsets['max'])
+    }
+
+
+def _accumulator_bytes(shape: Tuple[int, int]) -> int:
+    """Size of one chunk's accumulators in bytes"""
+    return shape[0] * shape[1] * 18
+
+
+def _accumulate_chunk(paths: List[str], shape: Tuple[int, int], slab_name: Optional[str] = None,
+                      rows: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Accumulate count, sum, sum of squares, min and max over a chunk of frames
+    
+    Each frame is read through a read-only memory map; the accumulators and
+    one scratch buffer are the only full-size allocations, so memory stays
+    constant regardless of the number of frames. With ``rows`` only that
+    band of rows is mapped and accumulated. With ``slab_name`` the
+    accumulators live in that shared memory slab and only the count and
+    skipped frames are returned to the parent.
+    """
+    if rows is not None:
+        offset = rows[0] * shape[1]
+        shape = (rows[1] - rows[0], shape[1])
+    else:
+        offset = 0
+    if slab_name is None:
+        buffer = bytearray(_accumulator_bytes(shape))
+    else:
+        buffer = attach_slab(slab_name)
+    views = _accumulator_views(buffer, shape)
+    total, total_sq = views['sum'], views['sum_sq']
+    minimum, maximum = views['min'], views['max']
+    total.fill(0)
+    total_sq.fill(0)
+    minimum.fill(255)
+    maximum.fill(0)
+    scratch = np.empty(shape, dtype=np.float64)
+    count = 0
+    skipped = []
+    
+    governor = get_governor()
+    for path in paths:
+        try:
+            frame = np.memmap(path, dtype=np.uint8, mode='r', shape=shape, offset=offset)
+        except (OSError, ValueError) as e:
+            skipped.append({'path': path, 'reason': str(e)})
+            continue
+        governor.throttle_read(frame.nbytes)
+        np.add(total, frame, out=total)
+        np.multiply(frame, frame, out=scratch, dtype=np.float64)
+        np.add(total_sq, scratch, out=total_sq)
+        np.minimum(minimum, frame, out=minimum)
+        np.maximum(maximum, frame, out=maximum)
+        count += 1
+        del frame
+    
+    result = {'count': count, 'skipped': skipped}
+    if slab_name is None:
+        result.update(views)
+    return result
+
+
+def _accumulate_worker(paths: List[str], shape: Tuple[int, int], slab_name: str,
+                       rows: Tuple[int, int]) -> Dict[str, Any]:
+    """Process pool task: accumulate a band of a chunk and report throttling back to the parent"""
+    result = _accumulate_chunk(paths, shape, slab_name, rows)
+    result['throttling'] = get_governor().drain_stats()
+    return result
+
+
+class FrameAggregator:
+    """Aggregates same-geometry RAW frames into per-pixel statistics"""
+    
+    STATISTICS = ('mean', 'max', 'min', 'std')
+    DEFAULT_STATISTICS = ('mean', 'max')
+    # Below this many frames the process pool costs more than it saves
+    PARALLEL_THRESHOLD = 64
+    # Docker gives containers a 64 MB /dev/shm by default; the slabs of all
+    # workers together stay within half of it
+    SHM_BUDGET = 32 * 1024 * 1024
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = get_governor().pool_size(max_workers)
+        self.image_processor = ImageProcessor()
+    
+    def aggregate(self, path: str, output_path: Optional[str] = None,
+                  statistics: Optional[List[str]] = None, pattern: str = '*.raw',
+                  max_frames: Optional[int] = None) -> Dict[str, Any]:
+        """Compute per-pixel statistics over the RAW frames in a directory
+        
+        Frames matching ``pattern`` are taken in natural order (up to
+        ``max_frames``); frames whose size differs from the first are skipped.
+        Each statistic is returned as a JPEG thumbnail and, with
+        ``output_path``, written at full resolution as ``<stem>_<stat><ext>``.
+        ``std`` images are scaled so the largest deviation maps to 255.
+        """
+        try:
+            statistics = list(statistics or self.DEFAULT_STATISTICS)
+            unknown = [stat for stat in statistics if stat not in self.STATISTICS]
+            if unknown:
+                raise ValueError(f"Unknown statistics: {', '.join(unknown)}")
+            
+            frames = self._select_frames(path, pattern, max_frames)
+            if not frames:
+                raise ValueError(f"No RAW frames matching {pattern} in {path}")
+            
+            first_size = os.path.getsize(frames[0])
+            width, height = self.image_processor._get_raw_dimensions(first_size)
+            if not width or not height:
+                raise ValueError(f"Invalid RAW file size: {first_size} bytes ({frames[0]})")
+            
+            same_geometry = []
+            skipped = []
+            for frame in frames:
+                try:
+                    if os.path.getsize(frame) == first_size:
+                        same_geometry.append(frame)
+                        continue
+                    reason = 'size differs from first frame'
+                except OSError as e:
+                    reason = str(e)
+                skipped.append({'path': frame, 'reason': reason})
+            
+            accumulated = self._accumulate(same_geometry, (height, width))
+            skipped.extend(accumulated['skipped'])
+            count = accumulated['count']
+            if count == 0:
+                raise ValueError("No frames could be read")
+            
+            mean = accumulated['sum'] / count
+            images = {}
+            summary = {}
+            for stat in statistics:
+                if stat == 'mean':
+                    values = mean
+                    image_data = np.clip(np.rint(mean), 0, 255).astype(np.uint8)
+                elif stat == 'std':
+                    values = np.sqrt(np.maximum(accumulated['sum_sq'] / count - mean * mean, 0.0))
+                    peak = float(values.max())
+                    scale = 255.0 / peak if peak > 0 else 0.0
+                    image_data = np.clip(np.rint(values * scale), 0, 255).astype(np.uint8)
+                else:
+                    values = accumulated[stat]
+                    image_data = values
+                summary[stat] = {
+                    'min': float(values.min()),
+                    'max': float(values.max()),
+                    'mean': float(values.mean())
+                }
+                images[stat] = Image.fromarray(image_data)
+            
+            result = {
+                'success': True,
+                'path': str(Path(path).absolute()),
+                'frame_count': count,
+                'skipped': skipped,
+                'size': (width, height),
+                'statistics': summary,
+                'thumbnails': {stat: self._thumbnail_base64(img) for stat, img in images.items()}
+            }
+            if output_path:
+                result['output_paths'] = self._save_images(images, output_path)
+            return result
+        
+        except Exception as e:
+            logger.error(f"Frame aggregation failed for {path}: {str(e)}")
+            raise Exception(f"Frame aggregation failed: {str(e)}")
+    
+    def _select_frames(self, path: str, pattern: str, max_frames: Optional[int]) -> List[str]:
+        """Collect RAW frames matching the pattern in natural order"""
+        directory = Path(path)
+        if not directory.is_dir():
+            raise NotADirectoryError(f"Path is not a directory: {path}")
+        
+        names = [entry.name for entry in os.scandir(directory)
+                 if entry.is_file() and entry.name.lower().endswith('.raw')
+                 and fnmatch.fnmatch(entry.name, pattern)]
+        names.sort(key=FileManager._natural_key)
+        if max_frames is not None:
+            names = names[:max_frames]
+        return [str(directory / name) for name in names]
+    
+    def _accumulate(self, frames: List[str], shape: Tuple[int, int]) -> Dict[str, Any]:
+        """Accumulate frames in one pass, split across a process pool for large stacks"""
+        if len(frames) < self.PARALLEL_THRESHOLD or self.max_workers < 2:
+            return _accumulate_chunk(frames, shape)
+        
+        chunk_size = -(-len(frames) // self.max_workers)
+        chunks = [frames[i:i + chunk_size] for i in range(0, len(frames), chunk_size)]
+        merged = {
+            'count': 0,
+            'sum': np.zeros(shape, dtype=np.float64),
+            'sum_sq': np.zeros(shape, dtype=np.float64),
+            'min': np.full(shape, 255, dtype=np.uint8),
+            'max': np.zeros(shape, dtype=np.uint8),
+            'skipped': []
+        }
+        
+        workers = len(chunks)
+        # Tile the accumulators by rows so one slab per worker fits the budget;
+        # each (chunk, band) task is merged and its slab recycled as it finishes
+        band_rows = max(1, min(shape[0], self.SHM_BUDGET // workers // _accumulator_bytes((1, shape[1]))))
+        bands = [(top, min(top + band_rows, shape[0])) for top in range(0, shape[0], band_rows)]
+        tasks = [(chunk, rows) for chunk in chunks for rows in bands]
+        
+        with SharedBufferPool(_accumulator_bytes((band_rows, shape[1])), workers) as pool, \
+                ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                    initargs=(get_governor().worker_settings(workers),)) as executor:
+            slabs = {}
+            
+            def submit(task: Tuple[int, Tuple[List[str], Tuple[int, int]]]):
+                index, (chunk, rows) = task
+                slabs[index] = pool.acquire()
+                return executor.submit(_accumulate_worker, chunk, shape, slabs[index], rows)
+            
+            for (index, (_, rows)), partial in bounded_map(submit, enumerate(tasks), workers):
+                slab = slabs.pop(index)
+                band_shape = (rows[1] - rows[0], shape[1])
+                partial.update(_accumulator_views(pool.view(slab), band_shape))
+                self._merge(merged, partial, rows)
+                # Drop the views on the slab before it is recycled and closed
+                del partial
+                pool.release(slab)
+        return merged
+    
+    @staticmethod
+    def _merge(merged: Dict[str, Any], partial: Dict[str, Any], rows: Tuple[int, int]) -> None:
+        """Fold one band of a chunk's accumulators into the running totals"""
+        band = slice(*rows)
+        for name, combine in (('sum', np.add), ('sum_sq', np.add), ('min', np.minimum), ('max', np.maximum)):
+            combine(merged[name][band], partial[name], out=merged[name][band])
+        # Every band of a chunk sees the same frames; count them once
+        if rows[0] == 0:
+            merged['count'] += partial['count']
+            merged['skipped'].extend(partial['skipped'])
+        get_governor().merge(partial.get('throttling'))
+    
+    def _thumbnail_base64(self, img: Image.Image) -> str:
+        """Encode a statistic image as a base64 JPEG thumbnail"""
+        thumbnail = img.copy()
+        thumbnail.thumbnail(self.image_processor.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, format='JPEG', quality=85)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    
+    def _save_images(self, images: Dict[str, Image.Image], output_path: str) -> Dict[str, str]:
+        """Write full-resolution statistic images next to output_path"""
+        output = Path(output_path)
+        suffix = output.suffix or '.png'
+        paths = {}
+        for stat, img in images.items():
+            target = output.with_name(f"{output.stem}_{stat}{suffix}")
+            img.save(target)
+            paths[stat] = str(target)
+        return paths
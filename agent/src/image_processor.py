@@ -5,29 +5,112 @@ Handles image processing and thumbnail generation
 
 import os
 import io
+import mmap
 import base64
-from typing import Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, Iterator, Optional, Tuple, List, Callable
 from pathlib import Path
 from PIL import Image
 import logging
 
+from instrumentation import NULL_TIMINGS
+from shm_pool import SharedBufferPool, attach_slab
+from resource_governor import get_governor, init_worker, bounded_map
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _thumbnail_worker(image_path: str, slab_name: str, slab_size: int,
+                      options: Dict[str, Any], preview_read: int = 0) -> Dict[str, Any]:
+    """Create one thumbnail in a pool worker, writing the encoded bytes into a shared slab
+    
+    Only the small result dict is pickled back; thumbnails larger than the
+    slab fall back to an inline base64 string. ``preview_read`` is the read
+    budget the parent already charged for this image's preview.
+    """
+    processor = ImageProcessor(**options)
+    if preview_read:
+        processor._preview_reads[str(Path(image_path))] = preview_read
+    
+    def write_to_slab(data: bytes) -> Optional[Dict[str, Any]]:
+        if len(data) > slab_size:
+            return None
+        attach_slab(slab_name)[:len(data)] = data
+        return {'slab_bytes': len(data)}
+    
+    processor.output_sink = write_to_slab
+    try:
+        result = processor.create_thumbnail(image_path)
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    # Merged into the parent's governor by _batch_result
+    result['throttling'] = get_governor().drain_stats()
+    return result
+
+
 class ImageProcessor:
     """Handles image processing operations"""
     
     THUMBNAIL_SIZE = (200, 200)
     SUPPORTED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP', 'BMP', 'TIFF'}
     
+    # Thumbnail encoders: name -> (Pillow format, MIME type, save options)
+    ENCODERS = {
+        'jpeg': ('JPEG', 'image/jpeg', {}),
+        'jpeg-progressive': ('JPEG', 'image/jpeg', {'progressive': True, 'optimize': True}),
+        'webp': ('WEBP', 'image/webp', {'method': 4}),
+        'png': ('PNG', 'image/png', {'compress_level': 1})
+    }
+    DEFAULT_ENCODER = 'jpeg'
+    DEFAULT_QUALITY = 85
+    # Lowest quality tried, and how far to shrink per step, when meeting a byte budget
+    MIN_QUALITY = 20
+    BUDGET_SHRINK = 0.75
+    
+    # Decode guards: declared pixel cap for compressed images (bomb guard) and
+    # the largest decoded buffer allowed before falling back to reduced decoding
+    DEFAULT_MAX_PIXELS = 1_000_000_000
+    DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+    # RAW files over the memory budget are reduced from a memory map in bands of this size
+    RAW_BAND_BYTES = 16 * 1024 * 1024
+    
+    # Batch thumbnails: shared slab size per in-flight thumbnail
+    BATCH_SLAB_SIZE = 1024 * 1024
+    
+    # Progressive thumbnails: previews are always baseline JPEG at this quality
+    PREVIEW_QUALITY = 60
+    
+    def __init__(self, timings=None, encoder: str = DEFAULT_ENCODER, quality: int = DEFAULT_QUALITY,
+                 max_bytes: Optional[int] = None, max_pixels: int = DEFAULT_MAX_PIXELS,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        if encoder not in self.ENCODERS:
+            raise ValueError(f"Unknown thumbnail encoder: {encoder}")
+        if not 1 <= quality <= 100:
+            raise ValueError("quality must be between 1 and 100")
+        # Phases: stat, open, decode/read, convert, resize, encode
+        self.timings = timings if timings is not None else NULL_TIMINGS
+        self.encoder = encoder
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.memory_budget = memory_budget
+        # Optional destination for encoded bytes instead of base64 (used by batch workers)
+        self.output_sink: Optional[Callable[[bytes], Optional[Dict[str, Any]]]] = None
+        # Bytes charged to the read budget by previews, deducted by the refined pass
+        self._preview_reads: Dict[str, int] = {}
+    
     def create_thumbnail(self, image_path: str, output_path: Optional[str] = None) -> Dict[str, Any]:
         """Create thumbnail for an image file"""
         try:
             path = Path(image_path)
-            if not path.exists():
+            with self.timings.span('stat'):
+                exists = path.exists()
+            if not exists:
                 raise FileNotFoundError(f"Image file not found: {image_path}")
+            if output_path and os.path.realpath(output_path) == os.path.realpath(image_path):
+                raise ValueError(f"Refusing to overwrite the source image {image_path}")
             
             # Handle RAW files
             if path.suffix.lower() == '.raw':
@@ -40,38 +123,219 @@ class ImageProcessor:
             logger.error(f"Failed to create thumbnail for {image_path}: {str(e)}")
             raise Exception(f"Thumbnail creation failed: {str(e)}")
     
+    def create_preview(self, image_path: str) -> Dict[str, Any]:
+        """Create a fast low-quality preview of the thumbnail, returned as base64 JPEG
+        
+        Standard images are decoded at the smallest JPEG draft scale covering
+        the thumbnail and box-filtered; RAW frames are nearest-sampled
+        straight from a memory map without decoding a full-size copy.
+        """
+        try:
+            path = Path(image_path)
+            with self.timings.span('preview'):
+                if path.suffix.lower() == '.raw':
+                    img, original_size, read_bytes = self._preview_raw(path)
+                else:
+                    img, original_size, read_bytes = self._preview_standard(path)
+                data = self._save(img, 'JPEG', {}, self.PREVIEW_QUALITY)
+            self._preview_reads[str(path)] = read_bytes
+            return {
+                'success': True,
+                'thumbnail_size': img.size,
+                'original_size': original_size,
+                'mime_type': 'image/jpeg',
+                'quality': self.PREVIEW_QUALITY,
+                'encoded_bytes': len(data),
+                'thumbnail_base64': base64.b64encode(data).decode('utf-8')
+            }
+        except Exception as e:
+            logger.error(f"Failed to create preview for {image_path}: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def progressive_thumbnail(self, image_path: str,
+                              output_path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a preview record and then the refined thumbnail record for one image"""
+        preview = self.create_preview(image_path)
+        if preview['success']:
+            yield dict(preview, type='thumbnail', stage='preview', path=image_path)
+        try:
+            result = self.create_thumbnail(image_path, output_path)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        yield dict(result, type='thumbnail', stage='final', path=image_path)
+    
+    def progressive_thumbnails(self, image_paths: List[str], output_dir: Optional[str] = None,
+                               workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield previews for every image first, then the refined thumbnails
+        
+        Previews are made in a thread pool (Pillow releases the GIL while
+        decoding and resizing) and yielded in input order; failed previews
+        are skipped since the final record reports the error. Refined
+        thumbnails then stream from ``iter_thumbnails``.
+        """
+        workers = get_governor().pool_size(workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            previews = bounded_map(lambda path: executor.submit(self.create_preview, path),
+                                   image_paths, workers * 2)
+            for path, preview in previews:
+                if preview['success']:
+                    yield dict(preview, type='thumbnail', stage='preview', path=path)
+        
+        for result in self._iter_thumbnails(image_paths, output_dir, workers):
+            yield dict(result, type='thumbnail', stage='final')
+    
+    def create_thumbnails(self, image_paths: List[str], output_dir: Optional[str] = None,
+                          workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Create thumbnails for many images across a process pool
+        
+        Workers write encoded thumbnails into slabs of a recycled
+        ``SharedBufferPool`` rather than pickling them back; the pool holds two
+        slabs per worker, which also bounds the tasks in flight. Results keep
+        the input order and failures are reported per image. With
+        ``output_dir`` thumbnails are written there as ``<name><ext>``;
+        outputs colliding with an input or with each other are refused.
+        """
+        return list(self.iter_thumbnails(image_paths, output_dir, workers))
+    
+    def iter_thumbnails(self, image_paths: List[str], output_dir: Optional[str] = None,
+                        workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield create_thumbnails results in input order as they complete"""
+        return self._iter_thumbnails(image_paths, output_dir, get_governor().pool_size(workers))
+    
+    def _iter_thumbnails(self, image_paths: List[str], output_dir: Optional[str],
+                         workers: int) -> Iterator[Dict[str, Any]]:
+        """iter_thumbnails with the pool size already resolved"""
+        governor = get_governor()
+        targets = self._batch_targets(image_paths, output_dir)
+        if workers < 2 or len(image_paths) < 2:
+            for path, (output_path, error) in zip(image_paths, targets):
+                yield self._batch_result(path, self._refused(error), None, output_path)
+            return
+        
+        options = {
+            'encoder': self.encoder,
+            'quality': self.quality,
+            'max_bytes': self.max_bytes,
+            'max_pixels': self.max_pixels,
+            'memory_budget': self.memory_budget
+        }
+        slab_size = max(self.BATCH_SLAB_SIZE, self.max_bytes or 0)
+        
+        with SharedBufferPool(slab_size, workers * 2) as pool, \
+                ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                    initargs=(governor.worker_settings(workers),)) as executor:
+            slabs = {}
+            
+            def submit(item: Tuple[int, str, Tuple[Optional[str], Optional[str]]]):
+                index, image_path, (_, error) = item
+                if error is not None:
+                    return self._refused(error)
+                slabs[index] = pool.acquire()
+                preview_read = self._preview_reads.pop(str(Path(image_path)), 0)
+                return executor.submit(_thumbnail_worker, image_path, slabs[index], slab_size, options,
+                                       preview_read)
+            
+            # Two slabs per worker, so a slab is always free for the next submission
+            items = ((index, path, target) for index, (path, target) in enumerate(zip(image_paths, targets)))
+            for (index, image_path, (output_path, _)), result in bounded_map(submit, items, workers * 2):
+                slab = slabs.pop(index, None)
+                if slab is None:
+                    yield self._batch_result(image_path, result, None, output_path)
+                    continue
+                try:
+                    record = self._batch_result(image_path, result, pool.view(slab), output_path)
+                finally:
+                    pool.release(slab)
+                yield record
+    
+    def _batch_targets(self, image_paths: List[str],
+                       output_dir: Optional[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+        """Output path and refusal reason (or None) for each batch item
+        
+        Thumbnails are named after the full source name (``a.jpg`` becomes
+        ``a.jpg.jpeg``) so sources differing only by extension stay apart.
+        An output that would overwrite an input image or another item's
+        thumbnail is refused instead of written.
+        """
+        if not output_dir:
+            return [(None, None)] * len(image_paths)
+        extension = '.' + self.ENCODERS[self.encoder][1].split('/')[1]
+        inputs = {os.path.realpath(path) for path in image_paths}
+        claimed = set()
+        targets = []
+        for image_path in image_paths:
+            output_path = str(Path(output_dir) / (Path(image_path).name + extension))
+            resolved = os.path.realpath(output_path)
+            error = None
+            if resolved in inputs:
+                error = f"Refusing to overwrite input image {output_path}"
+            elif resolved in claimed:
+                error = f"Thumbnail {output_path} collides with another image in the batch"
+            claimed.add(resolved)
+            targets.append((output_path, error))
+        return targets
+    
+    def _refused(self, error: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Failed batch result for a refused output, or None to process the item"""
+        return {'success': False, 'error': error} if error is not None else None
+    
+    def _batch_result(self, image_path: str, result: Optional[Dict[str, Any]], slab: Optional[memoryview],
+                      output_path: Optional[str]) -> Dict[str, Any]:
+        """Finish one batch item, producing it in-process when no worker result is given"""
+        if result is None:
+            try:
+                result = self.create_thumbnail(image_path, output_path)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+        else:
+            get_governor().merge(result.pop('throttling', None))
+        
+        try:
+            if 'slab_bytes' in result:
+                data = slab[:result.pop('slab_bytes')]
+                try:
+                    if output_path:
+                        with open(output_path, 'wb') as f:
+                            f.write(data)
+                        result['output_path'] = output_path
+                    else:
+                        result['thumbnail_base64'] = base64.b64encode(data).decode('utf-8')
+                finally:
+                    data.release()
+                self.timings.count('shared_memory_bytes', result['encoded_bytes'])
+            elif output_path and 'thumbnail_base64' in result:
+                with open(output_path, 'wb') as f:
+                    f.write(base64.b64decode(result.pop('thumbnail_base64')))
+                result['output_path'] = output_path
+        except OSError as e:
+            # Same per-item report as a failed in-process thumbnail
+            logger.error(f"Failed to write thumbnail for {image_path}: {str(e)}")
+            result = {'success': False, 'error': f"Thumbnail creation failed: {str(e)}"}
+        
+        result['path'] = image_path
+        return result
+    
     def _process_standard_image(self, path: Path, output_path: Optional[str] = None) -> Dict[str, Any]:
         """Process standard image formats"""
         try:
-            with Image.open(path) as img:
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
+            with self.timings.span('open'):
+                source, original_size = self._open_bounded(path, self.THUMBNAIL_SIZE)
+            with source:
+                img = source
+                with self.timings.span('decode'):
+                    img.load()
+                self.timings.count('bytes_read', path.stat().st_size)
+                
+                # Convert to a mode the encoder can write, keeping grayscale as L
+                if img.mode not in ('L', 'RGB'):
+                    with self.timings.span('convert'):
+                        img = self._convert_for_encoder(img)
                 
                 # Create thumbnail
-                img.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+                with self.timings.span('resize'):
+                    img.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
                 
-                # Save or return as base64
-                if output_path:
-                    img.save(output_path, 'JPEG', quality=85)
-                    return {
-                        'success': True,
-                        'output_path': output_path,
-                        'thumbnail_size': img.size,
-                        'original_size': Image.open(path).size
-                    }
-                else:
-                    # Return as base64 encoded string
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='JPEG', quality=85)
-                    thumbnail_b64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                    
-                    return {
-                        'success': True,
-                        'thumbnail_base64': thumbnail_b64,
-                        'thumbnail_size': img.size,
-                        'original_size': Image.open(path).size
-                    }
+                return self._thumbnail_result(img, original_size, output_path)
                     
         except Exception as e:
             raise Exception(f"Standard image processing failed: {str(e)}")
@@ -79,7 +343,8 @@ class ImageProcessor:
     def _process_raw_image(self, path: Path, output_path: Optional[str] = None) -> Dict[str, Any]:
         """Process RAW image files"""
         try:
-            file_size = path.stat().st_size
+            with self.timings.span('stat'):
+                file_size = path.stat().st_size
             
             # Determine dimensions
             width, height = self._get_raw_dimensions(file_size)
@@ -90,9 +355,20 @@ class ImageProcessor:
                     'error': f'Invalid RAW file size: {file_size} bytes (not 327,680 or perfect square)'
                 }
             
+            self._charge_read(path, file_size)
+            
+            if width * height > self.memory_budget:
+                # Too large to hold in memory: box-reduce straight from a memory map
+                with self.timings.span('decode'):
+                    img = self._decode_raw_banded(path, width, height, self._reduce_factor((width, height)))
+                self.timings.count('bytes_read', file_size)
+                return self._raw_thumbnail_result(img, (width, height), file_size, output_path)
+            
             # Read raw data
-            with open(path, 'rb') as f:
-                raw_data = f.read()
+            with self.timings.span('read'):
+                with open(path, 'rb') as f:
+                    raw_data = f.read()
+            self.timings.count('bytes_read', len(raw_data))
             
             # Validate data length matches expected size
             expected_size = width * height
@@ -105,7 +381,8 @@ class ImageProcessor:
             
             # Create PIL Image from raw grayscale data
             try:
-                img = Image.frombytes('L', (width, height), raw_data)
+                with self.timings.span('decode'):
+                    img = Image.frombytes('L', (width, height), raw_data)
             except Exception as e:
                 logger.error(f"Failed to create image from RAW data: {str(e)}")
                 return {
@@ -113,50 +390,7 @@ class ImageProcessor:
                     'error': f'Failed to interpret RAW data: {str(e)}'
                 }
             
-            # Create thumbnail
-            original_size = img.size
-            img.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-            
-            # Convert to RGB for JPEG output
-            img = img.convert('RGB')
-            
-            # Save or return as base64
-            if output_path:
-                img.save(output_path, 'JPEG', quality=85)
-                return {
-                    'success': True,
-                    'output_path': output_path,
-                    'thumbnail_size': img.size,
-                    'original_size': original_size,
-                    'raw_info': {
-                        'width': width, 
-                        'height': height, 
-                        'type': 'grayscale',
-                        'file_size': file_size,
-                        'is_640x512': file_size == 327680,
-                        'is_square': width == height
-                    }
-                }
-            else:
-                # Return as base64 encoded string
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=85)
-                thumbnail_b64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                
-                return {
-                    'success': True,
-                    'thumbnail_base64': thumbnail_b64,
-                    'thumbnail_size': img.size,
-                    'original_size': original_size,
-                    'raw_info': {
-                        'width': width, 
-                        'height': height, 
-                        'type': 'grayscale',
-                        'file_size': file_size,
-                        'is_640x512': file_size == 327680,
-                        'is_square': width == height
-                    }
-                }
+            return self._raw_thumbnail_result(img, img.size, file_size, output_path)
                 
         except Exception as e:
             logger.error(f"RAW image processing failed for {path}: {str(e)}")
@@ -165,6 +399,251 @@ class ImageProcessor:
                 'error': f"RAW image processing failed: {str(e)}"
             }
     
+    def _raw_thumbnail_result(self, img: Image.Image, original_size: tuple, file_size: int,
+                              output_path: Optional[str] = None) -> Dict[str, Any]:
+        """Resize a decoded RAW frame and build the response with raw_info"""
+        width, height = original_size
+        # Create thumbnail; it stays single-channel L for every encoder
+        with self.timings.span('resize'):
+            img.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        
+        result = self._thumbnail_result(img, original_size, output_path)
+        result['raw_info'] = {
+            'width': width, 
+            'height': height, 
+            'type': 'grayscale',
+            'file_size': file_size,
+            'is_640x512': file_size == 327680,
+            'is_square': width == height
+        }
+        return result
+    
+    def _preview_standard(self, path: Path) -> Tuple[Image.Image, Tuple[int, int], int]:
+        """Draft-decode and box-filter a standard image to preview size; also returns bytes charged"""
+        read_bytes = os.stat(path).st_size
+        source, original_size = self._open_bounded(path, self.THUMBNAIL_SIZE)
+        with source:
+            img = source
+            # No-op for non-JPEG formats or when _open_bounded already drafted
+            img.draft('L' if img.mode == 'L' else 'RGB', self.THUMBNAIL_SIZE)
+            img.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.BOX, reducing_gap=None)
+            if img.mode not in ('L', 'RGB'):
+                img = img.convert('L' if img.mode in ('LA', '1', 'I', 'I;16', 'F') else 'RGB')
+            return img.copy() if img is source else img, original_size, read_bytes
+    
+    def _preview_raw(self, path: Path) -> Tuple[Image.Image, Tuple[int, int], int]:
+        """Nearest-sample a RAW frame to preview size from a memory map; also returns bytes charged"""
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            width, height = self._get_raw_dimensions(file_size)
+            if width is None or height is None:
+                raise ValueError(f"Invalid RAW file size: {file_size} bytes")
+            scale = min(self.THUMBNAIL_SIZE[0] / width, self.THUMBNAIL_SIZE[1] / height, 1)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            read_bytes = self._sampled_bytes(width, height, size[1], file_size)
+            self._charge_read(path, read_bytes)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                full = Image.frombuffer('L', (width, height), mapped, 'raw', 'L', 0, 1)
+                img = full.resize(size, Image.Resampling.NEAREST)
+                # Release the view on the map before it is closed
+                del full
+        return img, (width, height), read_bytes
+    
+    def _charge_read(self, path: Path, nbytes: int) -> None:
+        """Charge the read budget for nbytes of path, less what a preview of it already paid"""
+        paid = self._preview_reads.pop(str(path), 0)
+        get_governor().throttle_read(max(0, nbytes - paid))
+    
+    @staticmethod
+    def _sampled_bytes(width: int, height: int, rows: int, file_size: int) -> int:
+        """Bytes paged in when nearest-sampling rows out of a mapped width x height frame
+        
+        The kernel faults in whole pages, so rows narrower than a page pull in
+        their neighbours too; with a row stride below ``mmap.PAGESIZE`` every
+        page of the file is read.
+        """
+        stride = width * max(1, height // rows)
+        if stride < mmap.PAGESIZE:
+            return file_size
+        pages = set()
+        for y in range(rows):
+            row = min(height - 1, int((y + 0.5) * height / rows))
+            start = row * width
+            pages.update(range(start // mmap.PAGESIZE, (start + width - 1) // mmap.PAGESIZE + 1))
+        return min(file_size, len(pages) * mmap.PAGESIZE)
+    
+    def _open_bounded(self, path: Path, target_size: Tuple[int, int]) -> Tuple[Image.Image, Tuple[int, int]]:
+        """Open an image lazily and make sure decoding it fits the budgets
+        
+        Only the header is parsed here. Images declaring more than
+        ``max_pixels`` are rejected outright; images whose decoded buffer
+        would exceed ``memory_budget`` are decoded at a reduced scale where
+        the format supports it (JPEG DCT scaling) and rejected otherwise.
+        Returns the still undecoded image and its original size.
+        """
+        self._charge_read(path, os.stat(path).st_size)
+        
+        try:
+            img = Image.open(path)
+        except Image.DecompressionBombError as e:
+            raise ValueError(f"Image is over the limit of {self.max_pixels} pixels: {str(e)}")
+        
+        try:
+            original_size = img.size
+            pixels = original_size[0] * original_size[1]
+            if pixels > self.max_pixels:
+                raise ValueError(f"Image declares {original_size[0]}x{original_size[1]} pixels, "
+                                 f"over the limit of {self.max_pixels}")
+            
+            if self._estimate_decode_bytes(img) > self.memory_budget:
+                if img.format == 'JPEG':
+                    # Request twice the target so the final LANCZOS pass has detail to work with
+                    img.draft('L' if img.mode == 'L' else 'RGB',
+                              (target_size[0] * 2, target_size[1] * 2))
+                    self.timings.count('reduced_decodes')
+                if self._estimate_decode_bytes(img) > self.memory_budget:
+                    raise ValueError(f"Decoding {original_size[0]}x{original_size[1]} {img.mode} image "
+                                     f"would exceed the memory budget of {self.memory_budget} bytes")
+            return img, original_size
+        except Exception:
+            img.close()
+            raise
+    
+    def _estimate_decode_bytes(self, img: Image.Image) -> int:
+        """Estimate peak bytes to decode and convert an image from its header"""
+        # Pillow stores 1/L/P in one byte per pixel, I;16 in two and everything else in four
+        if img.mode in ('1', 'L', 'P'):
+            bytes_per_pixel = 1
+        elif img.mode.startswith('I;16'):
+            bytes_per_pixel = 2
+        else:
+            bytes_per_pixel = 4
+        # Modes other than L/RGB are converted, holding a second full-size copy
+        # in the target mode: L for grayscale, RGB/RGBA (four bytes) otherwise
+        if img.mode not in ('L', 'RGB'):
+            bytes_per_pixel += 1 if img.mode in ('LA', '1', 'I', 'F') or img.mode.startswith('I;16') else 4
+        return img.size[0] * img.size[1] * bytes_per_pixel
+    
+    def _reduce_factor(self, size: Tuple[int, int]) -> int:
+        """Integer box-reduce factor leaving at least twice the thumbnail size"""
+        return max(1, min(size[0] // (self.THUMBNAIL_SIZE[0] * 2), size[1] // (self.THUMBNAIL_SIZE[1] * 2)))
+    
+    def _decode_raw_banded(self, path: Path, width: int, height: int, factor: int) -> Image.Image:
+        """Box-reduce a RAW frame from a memory map one band of rows at a time
+        
+        Peak memory is the reduced output plus one band; pages of finished
+        bands are released with madvise where the platform supports it.
+        """
+        reduced = Image.new('L', (-(-width // factor), -(-height // factor)))
+        band_rows = factor * max(1, self.RAW_BAND_BYTES // (width * factor))
+        
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if len(mapped) != width * height:
+                raise ValueError(f"RAW data size mismatch: expected {width * height} bytes, got {len(mapped)} bytes")
+            view = memoryview(mapped)
+            try:
+                for top in range(0, height, band_rows):
+                    rows = min(band_rows, height - top)
+                    start, end = top * width, (top + rows) * width
+                    band = Image.frombuffer('L', (width, rows), view[start:end], 'raw', 'L', 0, 1)
+                    reduced.paste(band.reduce(factor), (0, top // factor))
+                    del band
+                    if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+                        page_start = start - start % mmap.PAGESIZE
+                        mapped.madvise(mmap.MADV_DONTNEED, page_start, end - page_start)
+            finally:
+                view.release()
+        return reduced
+    
+    def _convert_for_encoder(self, img: Image.Image) -> Image.Image:
+        """Convert to L/RGB, or keep alpha (LA/RGBA) for encoders that support it"""
+        keeps_alpha = self.encoder in ('png', 'webp')
+        if img.mode in ('LA', '1', 'I', 'I;16', 'F'):
+            grayscale_mode = 'LA' if img.mode == 'LA' and keeps_alpha else 'L'
+            return img.convert(grayscale_mode)
+        if keeps_alpha and (img.mode in ('RGBA', 'PA') or 'transparency' in img.info):
+            return img.convert('RGBA')
+        return img.convert('RGB')
+    
+    def _thumbnail_result(self, img: Image.Image, original_size: tuple,
+                          output_path: Optional[str] = None) -> Dict[str, Any]:
+        """Encode the thumbnail and build the response, saving it or returning base64"""
+        with self.timings.span('encode'):
+            data, img, quality = self._encode(img)
+        
+        pil_format, mime_type, _ = self.ENCODERS[self.encoder]
+        result = {
+            'success': True,
+            'thumbnail_size': img.size,
+            'original_size': original_size,
+            'encoder': self.encoder,
+            'mime_type': mime_type,
+            'quality': quality,
+            'encoded_bytes': len(data)
+        }
+        if self.max_bytes is not None:
+            result['within_budget'] = len(data) <= self.max_bytes
+        
+        # Save or return as base64
+        if output_path:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+            result['output_path'] = output_path
+            return result
+        
+        sunk = self.output_sink(data) if self.output_sink is not None else None
+        if sunk is not None:
+            result.update(sunk)
+        else:
+            result['thumbnail_base64'] = base64.b64encode(data).decode('utf-8')
+        return result
+    
+    def _encode(self, img: Image.Image) -> Tuple[bytes, Image.Image, Optional[int]]:
+        """Encode with the configured encoder, meeting max_bytes if set
+        
+        Lossy encoders first binary-search the highest quality that fits the
+        budget; if even MIN_QUALITY is too large (or the encoder is lossless)
+        the image is shrunk step by step. Returns the bytes, the image that
+        was encoded and the quality used (None for PNG).
+        """
+        pil_format, _, options = self.ENCODERS[self.encoder]
+        lossy = pil_format != 'PNG'
+        quality = self.quality if lossy else None
+        data = self._save(img, pil_format, options, quality)
+        if self.max_bytes is None or len(data) <= self.max_bytes:
+            return data, img, quality
+        
+        if lossy:
+            low, high = self.MIN_QUALITY, self.quality - 1
+            best = None
+            while low <= high:
+                candidate = (low + high) // 2
+                candidate_data = self._save(img, pil_format, options, candidate)
+                if len(candidate_data) <= self.max_bytes:
+                    best = (candidate_data, candidate)
+                    low = candidate + 1
+                else:
+                    high = candidate - 1
+            if best is not None:
+                return best[0], img, best[1]
+            quality = self.MIN_QUALITY
+        
+        while len(data) > self.max_bytes and min(img.size) > 16:
+            size = (max(1, int(img.width * self.BUDGET_SHRINK)), max(1, int(img.height * self.BUDGET_SHRINK)))
+            img = img.resize(size, Image.Resampling.BILINEAR)
+            data = self._save(img, pil_format, options, quality)
+        return data, img, quality
+    
+    def _save(self, img: Image.Image, pil_format: str, options: Dict[str, Any],
+              quality: Optional[int]) -> bytes:
+        """Encode an image to bytes in memory"""
+        buffer = io.BytesIO()
+        if quality is None:
+            img.save(buffer, format=pil_format, **options)
+        else:
+            img.save(buffer, format=pil_format, quality=quality, **options)
+        return buffer.getvalue()
+    
     def _get_raw_dimensions(self, file_size: int) -> tuple[Optional[int], Optional[int]]:
         """Determine RAW image dimensions based on file size"""
         # Check for 327,680 bytes (640x512)
@@ -178,4 +657,10 @@ class ImageProcessor:
             return sqrt_size, sqrt_size
         
         # Invalid size
-        return None, None
\ No newline at end of file
+        return None, None
+
+
+# Pillow's own bomb check would reject large images before the reduced-decode
+# fallback can run; lift it once to the default max_pixels, which each
+# processor enforces itself after parsing the header
+Image.MAX_IMAGE_PIXELS = ImageProcessor.DEFAULT_MAX_PIXELS
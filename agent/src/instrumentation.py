@@ -0,0 +1,161 @@
+"""
+Instrumentation Module
+Timing spans, counters and aggregated per-command metrics
+"""
+
+import sys
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process in bytes, if known"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Timings:
+    """Collects named timing spans and counters for one command
+    
+    Repeated spans with the same name accumulate, so a span around a
+    per-entry operation reports the total time and the number of calls.
+    Spans and counters may be recorded from pool threads concurrently.
+    """
+    
+    enabled = True
+    
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block under the given phase name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                record = self.spans.setdefault(name, [0.0, 0])
+                record[0] += elapsed
+                record[1] += 1
+    
+    def count(self, name: str, value: int = 1) -> None:
+        """Add to a named counter (e.g. bytes_read)"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def totals(self) -> Tuple[Dict[str, float], Dict[str, int]]:
+        """Consistent copy of the span durations in seconds and the counters"""
+        with self._lock:
+            return {name: seconds for name, (seconds, _) in self.spans.items()}, dict(self.counters)
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """Report spans in milliseconds together with counters and peak RSS"""
+        with self._lock:
+            spans = {name: {'ms': round(seconds * 1000, 3), 'count': count}
+                     for name, (seconds, count) in self.spans.items()}
+            counters = dict(self.counters)
+        return {
+            'total_ms': round((time.perf_counter() - self._start) * 1000, 3),
+            'spans': spans,
+            'counters': counters,
+            'peak_rss_bytes': peak_rss_bytes()
+        }
+
+
+class _NullTimings:
+    """Timings stand-in used when instrumentation is off; every call is a no-op"""
+    
+    enabled = False
+    
+    def span(self, name: str):
+        return nullcontext()
+    
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+
+NULL_TIMINGS = _NullTimings()
+
+
+class MetricsRegistry:
+    """Thread-safe per-command counters and latency histograms
+    
+    Aggregates across every command run by a long-lived process (for example
+    the load-test harness or a caller embedding ``execute_command``).
+    """
+    
+    # Upper bounds of the latency buckets in milliseconds
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands: Dict[str, Dict[str, Any]] = {}
+    
+    def record(self, command: str, seconds: float, error: bool = False,
+               timings: Optional[Timings] = None) -> None:
+        """Record one command execution"""
+        elapsed_ms = seconds * 1000
+        bucket = next((index for index, bound in enumerate(self.BUCKETS_MS) if elapsed_ms <= bound),
+                      len(self.BUCKETS_MS))
+        span_seconds, counters = timings.totals() if timings is not None and timings.enabled else ({}, {})
+        with self._lock:
+            stats = self._commands.get(command)
+            if stats is None:
+                stats = self._commands[command] = {
+                    'count': 0,
+                    'errors': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'buckets': [0] * (len(self.BUCKETS_MS) + 1),
+                    'spans_ms': {},
+                    'counters': {}
+                }
+            stats['count'] += 1
+            stats['errors'] += int(error)
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['buckets'][bucket] += 1
+            for name, seconds in span_seconds.items():
+                stats['spans_ms'][name] = stats['spans_ms'].get(name, 0.0) + seconds * 1000
+            for name, value in counters.items():
+                stats['counters'][name] = stats['counters'].get(name, 0) + value
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serialisable copy of the aggregated metrics"""
+        labels = [f'<={bound}ms' for bound in self.BUCKETS_MS] + [f'>{self.BUCKETS_MS[-1]}ms']
+        with self._lock:
+            return {
+                command: {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'mean_ms': round(stats['total_ms'] / stats['count'], 3),
+                    'max_ms': round(stats['max_ms'], 3),
+                    'histogram': {label: n for label, n in zip(labels, stats['buckets']) if n},
+                    'spans_ms': {name: round(ms, 3) for name, ms in stats['spans_ms'].items()},
+                    'counters': dict(stats['counters'])
+                }
+                for command, stats in self._commands.items()
+            }
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._commands.clear()
+
+
+# Process-wide registry fed by execute_command
+METRICS = MetricsRegistry()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Load Generator Module
+Simulates concurrent viewer sessions against the agent and reports throughput and tail latency
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from PIL import Image
+
+from main import execute_command
+from instrumentation import METRICS, Timings
+
+# Relative weights of the operations a browsing viewer issues
+DEFAULT_MIX = {'list': 5, 'metadata': 3, 'thumbnail': 2}
+MODES = ('inprocess', 'subprocess')
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+
+def build_dataset(directory: str, raw_frames: int = 200, images: int = 40,
+                  subdirectories: int = 4, seed: int = 0) -> Dict[str, List[str]]:
+    """Write a synthetic capture tree of RAW frames and standard images
+    
+    Frames (640x512 8-bit RAW) and images (JPEG and PNG) are spread over
+    ``subdirectories`` capture folders. Returns the directories and files
+    the simulated sessions draw from.
+    """
+    rng = random.Random(seed)
+    root = Path(directory)
+    folders = [root / f'capture_{index:02d}' for index in range(subdirectories)]
+    dataset = {'directories': [str(root)] + [str(folder) for folder in folders], 'files': [], 'images': []}
+    for folder in folders:
+        folder.mkdir(parents=True, exist_ok=True)
+    
+    for index in range(raw_frames):
+        path = folders[index % subdirectories] / f'frame_{index:06d}.raw'
+        path.write_bytes(rng.randbytes(640 * 512))
+        dataset['files'].append(str(path))
+        dataset['images'].append(str(path))
+    
+    for index in range(images):
+        extension = '.jpg' if index % 2 == 0 else '.png'
+        path = folders[index % subdirectories] / f'image_{index:04d}{extension}'
+        Image.frombytes('RGB', (1024, 768), rng.randbytes(1024 * 768 * 3)).save(path)
+        dataset['files'].append(str(path))
+        dataset['images'].append(str(path))
+    
+    return dataset
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list (0 when empty)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LoadTest:
+    """Runs concurrent sessions that each issue a weighted mix of agent commands
+    
+    In ``inprocess`` mode every session is a thread calling ``execute_command``
+    directly, as an embedding daemon would. In ``subprocess`` mode each
+    request starts ``main.py`` like the backend does over SSH, so process
+    start-up and imports are included in the latency.
+    """
+    
+    def __init__(self, dataset: Dict[str, List[str]], sessions: int = 20,
+                 mix: Optional[Dict[str, int]] = None, mode: str = 'inprocess',
+                 think_time: float = 0.0, seed: int = 0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        if sessions < 1:
+            raise ValueError("sessions must be positive")
+        self.dataset = dataset
+        self.sessions = sessions
+        self.mix = mix or DEFAULT_MIX
+        self.mode = mode
+        self.think_time = think_time
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._samples: List[Tuple[str, float, bool]] = []
+        self._errors: Dict[str, int] = {}
+    
+    def run(self, duration: Optional[float] = None,
+            requests_per_session: Optional[int] = None) -> Dict[str, Any]:
+        """Run every session until the duration elapses or its request quota is met"""
+        if duration is None and requests_per_session is None:
+            raise ValueError("Either duration or requests_per_session is required")
+        METRICS.reset()
+        self._samples.clear()
+        self._errors.clear()
+        
+        deadline = time.perf_counter() + duration if duration is not None else None
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as output_dir:
+            threads = [threading.Thread(target=self._session,
+                                        args=(index, deadline, requests_per_session, output_dir),
+                                        daemon=True)
+                       for index in range(self.sessions)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+        
+        return self._report(elapsed)
+    
+    def _session(self, index: int, deadline: Optional[float], quota: Optional[int],
+                 output_dir: str) -> None:
+        rng = random.Random(self.seed * 1000 + index)
+        commands, weights = zip(*self.mix.items())
+        issued = 0
+        while (quota is None or issued < quota) and (deadline is None or time.perf_counter() < deadline):
+            command = rng.choices(commands, weights)[0]
+            path, output = self._request(command, rng, index, issued, output_dir)
+            started = time.perf_counter()
+            error = None
+            try:
+                error = self._execute(command, path, output)
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            latency = time.perf_counter() - started
+            with self._lock:
+                self._samples.append((command, latency, error is not None))
+                if error is not None:
+                    self._errors[error] = self._errors.get(error, 0) + 1
+            issued += 1
+            if self.think_time:
+                time.sleep(rng.uniform(0, 2 * self.think_time))
+    
+    def _request(self, command: str, rng: random.Random, session: int, issued: int,
+                 output_dir: str) -> Tuple[str, Optional[str]]:
+        """Pick the path (and thumbnail output) for one request"""
+        if command == 'list':
+            return rng.choice(self.dataset['directories']), None
+        if command == 'thumbnail':
+            image = rng.choice(self.dataset['images'])
+            return image, os.path.join(output_dir, f'session{session}_{issued}.jpg')
+        return rng.choice(self.dataset['files']), None
+    
+    def _execute(self, command: str, path: str, output: Optional[str]) -> Optional[str]:
+        """Run one request, returning an error description or None"""
+        if self.mode == 'inprocess':
+            # Fresh timings per request so METRICS aggregates each command's phases
+            result = execute_command(command, path, output, timings=Timings())
+            if result.get('success') is False:
+                return result.get('error', 'unsuccessful')
+            return None
+        
+        args = [sys.executable, MAIN_SCRIPT, command, '--path', path]
+        if output:
+            args += ['--output', output]
+        completed = subprocess.run(args, capture_output=True, text=True)
+        if completed.returncode != 0:
+            try:
+                return json.loads(completed.stderr)['error']
+            except (ValueError, KeyError, TypeError):
+                return completed.stderr.strip() or f"exit code {completed.returncode}"
+        return None
+    
+    def _report(self, elapsed: float) -> Dict[str, Any]:
+        def summarize(samples: List[Tuple[str, float, bool]]) -> Dict[str, Any]:
+            latencies = sorted(latency * 1000 for _, latency, _ in samples)
+            errors = sum(1 for _, _, failed in samples if failed)
+            return {
+                'requests': len(samples),
+                'errors': errors,
+                'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+                'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                'latency_ms': {
+                    'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                    'p50': round(percentile(latencies, 50), 3),
+                    'p95': round(percentile(latencies, 95), 3),
+                    'p99': round(percentile(latencies, 99), 3),
+                    'max': round(latencies[-1], 3) if latencies else 0.0
+                }
+            }
+        
+        report = {
+            'mode': self.mode,
+            'sessions': self.sessions,
+            'mix': dict(self.mix),
+            'elapsed_s': round(elapsed, 3),
+            'overall': summarize(self._samples),
+            'commands': {command: summarize([s for s in self._samples if s[0] == command])
+                         for command in self.mix},
+            'top_errors': dict(sorted(self._errors.items(), key=lambda item: -item[1])[:10])
+        }
+        if self.mode == 'inprocess':
+            # Per-phase spans and histograms aggregated by execute_command
+            report['agent_metrics'] = METRICS.snapshot()
+        return report
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """Parse 'list=5,metadata=3,thumbnail=2' into command weights"""
+    mix = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        command, _, weight = part.partition('=')
+        command = command.strip()
+        if command not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unsupported command in mix: {command}")
+        try:
+            mix[command] = int(weight) if weight else 1
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight for {command}: {weight}")
+    if not mix or not any(mix.values()):
+        raise argparse.ArgumentTypeError("Mix must give at least one command a positive weight")
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Remote Raw Viewer Agent load test')
+    parser.add_argument('--sessions', type=int, default=20, help='Concurrent viewer sessions')
+    parser.add_argument('--duration', type=float, default=10.0, help='Test duration in seconds')
+    parser.add_argument('--requests', type=int,
+                        help='Requests per session (overrides --duration)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Weighted command mix, e.g. list=5,metadata=3,thumbnail=2')
+    parser.add_argument('--mode', choices=MODES, default='inprocess',
+                        help='Call execute_command in threads, or start the CLI per request')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='Mean pause between a session\'s requests in seconds')
+    parser.add_argument('--dataset', help='Existing directory to build the synthetic dataset in')
+    parser.add_argument('--raw-frames', type=int, default=200, help='Synthetic RAW frames')
+    parser.add_argument('--images', type=int, default=40, help='Synthetic JPEG/PNG images')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for data and request choice')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+    
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dataset = build_dataset(args.dataset or temp_dir, args.raw_frames, args.images, seed=args.seed)
+            load_test = LoadTest(dataset, args.sessions, args.mix, args.mode, args.think_time, args.seed)
+            report = load_test.run(None if args.requests else args.duration, args.requests)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+        return 0
+    except Exception as e:
+        print(json.dumps({'error': str(e)}, indent=2), file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
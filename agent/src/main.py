@@ -7,44 +7,441 @@ Main CLI entry point for remote server operations
 import argparse
 import json
 import sys
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Iterator, Optional
 from file_manager import FileManager
 from image_processor import ImageProcessor
+from sequence_processor import SequenceProcessor
+from manifest import ManifestBuilder
+from content_hasher import ContentHasher, DigestCache
+from resource_governor import ResourceGovernor, get_governor, set_governor
+from instrumentation import Timings, NULL_TIMINGS, METRICS
+
+COMMANDS = ('list', 'thumbnail', 'thumbnails', 'metadata', 'sequence', 'aggregate', 'manifest', 'hash')
+# Commands whose CLI output is streamed as NDJSON records
+STREAMING_COMMANDS = ('manifest', 'hash')
+# Commands that stream a fast preview before each refined thumbnail with --progressive
+PROGRESSIVE_COMMANDS = ('thumbnail', 'thumbnails')
 
 
 def main():
     parser = argparse.ArgumentParser(description='Remote Raw Viewer Agent')
-    parser.add_argument('command', choices=['list', 'thumbnail', 'metadata'], 
+    parser.add_argument('command', choices=COMMANDS, 
                        help='Command to execute')
     parser.add_argument('--path', required=True, help='File or directory path')
     parser.add_argument('--output', help='Output file path (optional)')
+    parser.add_argument('--timing', action='store_true',
+                        help='Include a per-phase timing breakdown in the response')
+    parser.add_argument('--metrics-file', help='Append the timing breakdown as a JSON line to this file')
+    
+    thumbnail = parser.add_argument_group('thumbnail options')
+    thumbnail.add_argument('--encoder', choices=ImageProcessor.ENCODERS, default=ImageProcessor.DEFAULT_ENCODER,
+                           help='Thumbnail encoder (grayscale sources stay single-channel)')
+    thumbnail.add_argument('--quality', type=int, default=ImageProcessor.DEFAULT_QUALITY,
+                           help='Quality for lossy encoders (1-100)')
+    thumbnail.add_argument('--max-bytes', type=int,
+                           help='Target size budget per thumbnail; lowers quality, then resolution')
+    thumbnail.add_argument('--max-pixels', type=int, default=ImageProcessor.DEFAULT_MAX_PIXELS,
+                           help='Reject images whose header declares more pixels than this')
+    thumbnail.add_argument('--memory-budget', type=int, default=ImageProcessor.DEFAULT_MEMORY_BUDGET,
+                           help='Largest decoded image in bytes before reduced decoding is used')
+    
+    thumbnail.add_argument('--workers', type=int,
+                           help='Worker processes for the thumbnails command (default: CPU count, max 8)')
+    thumbnail.add_argument('--progressive', action='store_true',
+                           help='Stream NDJSON: a fast preview of each image first, then the refined '
+                                'thumbnail (--output still names the thumbnail file or directory)')
+    
+    listing = parser.add_argument_group('list options (also select files for thumbnails)')
+    listing.add_argument('--sort', choices=FileManager.SORT_KEYS,
+                         help='Sort key (natural orders frame_2 before frame_10); '
+                              'default name for list, natural for thumbnails')
+    listing.add_argument('--reverse', action='store_true', help='Reverse the sort order')
+    listing.add_argument('--pattern', help='Glob pattern matched against entry names')
+    listing.add_argument('--regex', help='Regular expression searched in entry names')
+    listing.add_argument('--extensions', help='Comma-separated extensions to include (e.g. raw,png)')
+    listing.add_argument('--min-size', type=int, help='Minimum file size in bytes')
+    listing.add_argument('--max-size', type=int, help='Maximum file size in bytes')
+    listing.add_argument('--modified-after', type=float, help='Minimum modification time (epoch seconds)')
+    listing.add_argument('--modified-before', type=float, help='Maximum modification time (epoch seconds)')
+    listing.add_argument('--valid-raw-only', action='store_true',
+                         help='Only include RAW files with recognised dimensions')
+    listing.add_argument('--offset', type=int, default=0, help='Number of matching entries to skip')
+    listing.add_argument('--limit', type=int, help='Maximum number of entries to return')
+    listing.add_argument('--format', choices=FileManager.OUTPUT_FORMATS, default='full',
+                         help='Listing format; compact emits column arrays as minified JSON')
+    
+    sequence = parser.add_argument_group('sequence options')
+    sequence.add_argument('--sequence', dest='sequence_id',
+                          help='Sequence id to preview, e.g. frame_%%06d.raw (default: longest)')
+    sequence.add_argument('--max-frames', type=int,
+                          help='Maximum number of frames to use (sequence default: '
+                               f'{SequenceProcessor.DEFAULT_MAX_FRAMES}, aggregate default: all)')
+    sequence.add_argument('--step', type=int, help='Use every N-th frame instead of even sampling')
+    sequence.add_argument('--fps', type=float, default=SequenceProcessor.DEFAULT_FPS,
+                          help='Preview playback rate')
+    sequence.add_argument('--clip-format', choices=SequenceProcessor.CLIP_FORMATS, default='gif',
+                          help='Animated preview format')
+    
+    aggregate = parser.add_argument_group('aggregate options')
+    # Statistic names are spelled out rather than read from FrameAggregator, which
+    # pulls in numpy and is only imported when an aggregate command runs
+    aggregate.add_argument('--stats', help="Comma-separated statistics (mean, max, min, std; default: mean,max); "
+                                           "frames are selected with --pattern and --max-frames")
+    
+    manifest = parser.add_argument_group('manifest options (NDJSON output, to --output if given)')
+    manifest.add_argument('--hash', nargs='?', const=ManifestBuilder.DEFAULT_HASH_ALGORITHM,
+                          choices=ManifestBuilder.HASH_ALGORITHMS,
+                          help=f'Include content hashes (default algorithm: {ManifestBuilder.DEFAULT_HASH_ALGORITHM})')
+    manifest.add_argument('--diff', help='Previous manifest to diff against; only changes are emitted')
+    manifest.add_argument('--include-unchanged', action='store_true',
+                          help='With --diff, also emit unchanged files (a full manifest)')
+    
+    hashing = parser.add_argument_group('hash options (NDJSON output; --pattern filters file names)')
+    hashing.add_argument('--algorithm', choices=ContentHasher.HASH_ALGORITHMS,
+                         default=ContentHasher.DEFAULT_HASH_ALGORITHM, help='Digest algorithm')
+    hashing.add_argument('--hash-cache',
+                         help=f'Digest cache file keyed by inode, size and mtime, also used by manifest --hash '
+                              f'(default: ${DigestCache.ENVIRONMENT_VARIABLE} or {DigestCache.DEFAULT_PATH}; '
+                              f'"{DigestCache.DISABLED}" keeps digests for this run only)')
+    
+    limits = parser.add_argument_group('resource limits (default to the RRV_AGENT_* environment variables)')
+    limits.add_argument('--max-workers', type=int, help='Cap on worker processes/threads of any pool')
+    limits.add_argument('--nice', type=int, help='Run at this niceness (can only be raised)')
+    limits.add_argument('--ionice', choices=ResourceGovernor.IONICE_CLASSES, help='I/O scheduling class')
+    limits.add_argument('--read-bandwidth', type=float, help='Maximum file read rate in bytes per second')
+    limits.add_argument('--max-in-flight', type=int,
+                        help='Maximum concurrent agent requests on this host; others wait for a slot')
+    limits.add_argument('--slot-dir', help=f'Directory of request slot lock files '
+                                           f'(default: {ResourceGovernor.DEFAULT_SLOT_DIR})')
     
     args = parser.parse_args()
     
     try:
-        result = execute_command(args.command, args.path, args.output)
-        print(json.dumps(result, indent=2))
+        set_governor(ResourceGovernor.from_environment(
+            max_workers=args.max_workers, nice=args.nice, ionice=args.ionice,
+            read_bandwidth=args.read_bandwidth, max_in_flight=args.max_in_flight, slot_dir=args.slot_dir))
+    except ValueError as e:
+        print(json.dumps({'error': str(e)}, indent=2), file=sys.stderr)
+        return 1
+    
+    timings = Timings() if args.timing or args.metrics_file else None
+    if args.command in STREAMING_COMMANDS or (args.progressive and args.command in PROGRESSIVE_COMMANDS):
+        return run_streaming(args, timings)
+    try:
+        result = execute_command(args.command, args.path, args.output, build_options(args), timings)
+        if args.metrics_file:
+            write_metrics(args.metrics_file, args.command, args.path,
+                          result.pop('timing') if not args.timing else result['timing'])
+        if args.command == 'list' and args.format == 'compact':
+            print(json.dumps(result, separators=(',', ':')))
+        else:
+            print(json.dumps(result, indent=2))
         return 0
     except Exception as e:
         print(json.dumps({'error': str(e)}, indent=2), file=sys.stderr)
         return 1
 
 
-def execute_command(command: str, path: str, output: str = None) -> Dict[str, Any]:
-    """Execute the specified command and return results"""
+def run_streaming(args: argparse.Namespace, timings: Optional[Timings]) -> int:
+    """Write a streaming command's records as NDJSON to --output or stdout
     
-    file_manager = FileManager()
-    image_processor = ImageProcessor()
+    For progressive thumbnails --output is the thumbnail destination and
+    records always go to stdout. A single thumbnail whose final record
+    failed exits non-zero, as it does without --progressive.
+    """
+    progressive = args.command in PROGRESSIVE_COMMANDS
+    out = open(args.output, 'w') if args.output and not progressive else sys.stdout
+    try:
+        records = stream_command(args.command, args.path, build_options(args), timings,
+                                 output=args.output if progressive else None)
+        for record in records:
+            if record.get('type') == 'timing' and not args.timing:
+                continue
+            out.write(json.dumps(record, separators=(',', ':')) + '\n')
+            out.flush()
+            if args.command == 'thumbnail' and record.get('stage') == 'final' and not record.get('success'):
+                raise Exception(record['error'])
+        if args.metrics_file:
+            write_metrics(args.metrics_file, args.command, args.path, timings.as_dict())
+        return 0
+    except Exception as e:
+        print(json.dumps({'error': str(e)}, indent=2), file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def build_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """Collect the command options that differ from their defaults"""
+    options = {}
+    if args.command == 'list':
+        options.update(_listing_options(args))
+        if args.format != 'full':
+            options['output_format'] = args.format
+    elif args.command == 'thumbnail':
+        options.update(_thumbnail_options(args))
+    elif args.command == 'thumbnails':
+        options.update(_thumbnail_options(args))
+        options['selection'] = _listing_options(args)
+        if args.workers is not None:
+            options['workers'] = args.workers
+    elif args.command == 'sequence':
+        if args.sequence_id:
+            options['sequence_id'] = args.sequence_id
+        if args.max_frames is not None:
+            options['max_frames'] = args.max_frames
+        if args.step is not None:
+            options['step'] = args.step
+        if args.fps != SequenceProcessor.DEFAULT_FPS:
+            options['fps'] = args.fps
+        if args.clip_format != 'gif':
+            options['clip_format'] = args.clip_format
+    elif args.command == 'manifest':
+        if args.hash:
+            options['hash_algorithm'] = args.hash
+        if args.diff:
+            options['previous_manifest'] = args.diff
+        if args.include_unchanged:
+            options['include_unchanged'] = True
+        if args.hash_cache:
+            options['hash_cache'] = args.hash_cache
+    elif args.command == 'hash':
+        if args.algorithm != ContentHasher.DEFAULT_HASH_ALGORITHM:
+            options['hash_algorithm'] = args.algorithm
+        if args.pattern:
+            options['pattern'] = args.pattern
+        if args.hash_cache:
+            options['hash_cache'] = args.hash_cache
+    elif args.command == 'aggregate':
+        if args.stats:
+            options['statistics'] = [stat.strip() for stat in args.stats.split(',') if stat.strip()]
+        if args.pattern:
+            options['pattern'] = args.pattern
+        if args.max_frames is not None:
+            options['max_frames'] = args.max_frames
+    return options
+
+
+def write_metrics(metrics_file: str, command: str, path: str, timing: Dict[str, Any]) -> None:
+    """Append one command's timing breakdown to a JSON lines file"""
+    record = {'timestamp': time.time(), 'command': command, 'path': path, 'timing': timing}
+    with open(metrics_file, 'a') as f:
+        f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def _listing_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """Directory listing filters, sort and pagination options"""
+    options = {}
+    if args.sort is not None:
+        options['sort_by'] = args.sort
+    if args.reverse:
+        options['reverse'] = True
+    if args.pattern:
+        options['pattern'] = args.pattern
+    if args.regex:
+        options['regex'] = args.regex
+    if args.extensions:
+        options['extensions'] = [ext.strip() for ext in args.extensions.split(',') if ext.strip()]
+    for name in ('min_size', 'max_size', 'modified_after', 'modified_before', 'limit'):
+        if getattr(args, name) is not None:
+            options[name] = getattr(args, name)
+    if args.valid_raw_only:
+        options['valid_raw_only'] = True
+    if args.offset:
+        options['offset'] = args.offset
+    return options
+
+
+def _thumbnail_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """Thumbnail encoder and decode budget options"""
+    options = {}
+    if args.encoder != ImageProcessor.DEFAULT_ENCODER:
+        options['encoder'] = args.encoder
+    if args.quality != ImageProcessor.DEFAULT_QUALITY:
+        options['quality'] = args.quality
+    if args.max_bytes is not None:
+        options['max_bytes'] = args.max_bytes
+    if args.max_pixels != ImageProcessor.DEFAULT_MAX_PIXELS:
+        options['max_pixels'] = args.max_pixels
+    if args.memory_budget != ImageProcessor.DEFAULT_MEMORY_BUDGET:
+        options['memory_budget'] = args.memory_budget
+    return options
+
+
+def execute_command(command: str, path: str, output: str = None,
+                    options: Optional[Dict[str, Any]] = None,
+                    timings: Optional[Timings] = None) -> Dict[str, Any]:
+    """Execute the specified command and return results
+    
+    Every call is recorded in the process-wide ``METRICS`` registry. When
+    ``timings`` is given, the per-phase breakdown is also returned under the
+    result's ``'timing'`` key. The call runs under the process's resource
+    governor; when it has limits configured, the throttling applied is
+    returned under ``'throttling'``.
+    """
+    if command not in COMMANDS:
+        raise ValueError(f"Unknown command: {command}")
+    
+    governor = get_governor()
+    governor.apply_priority()
+    before = governor.stats()
+    start = time.perf_counter()
+    failed = True
+    throttling = None
+    try:
+        with governor.request():
+            result = _dispatch(command, path, output, options or {},
+                               timings if timings is not None else NULL_TIMINGS)
+        failed = result.get('success') is False
+    finally:
+        if governor.enabled:
+            throttling = _throttling(governor, before, timings)
+        METRICS.record(command, time.perf_counter() - start, failed, timings)
+    
+    if throttling is not None:
+        result['throttling'] = throttling
+    if timings is not None:
+        result['timing'] = timings.as_dict()
+    return result
+
+
+def stream_command(command: str, path: str, options: Optional[Dict[str, Any]] = None,
+                   timings: Optional[Timings] = None, output: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Execute a streaming command, yielding records as they are produced
+    
+    Thumbnail commands stream progressively: a ``stage: 'preview'`` record
+    per image, then ``stage: 'final'`` records as refined thumbnails are
+    written to ``output`` or returned inline. The command is recorded in
+    ``METRICS`` once the stream is exhausted or closed. With governor limits
+    configured a ``{'type': 'throttling'}`` record follows the command's
+    records, and with ``timings`` a final ``{'type': 'timing'}`` record is
+    added.
+    """
+    if command not in STREAMING_COMMANDS + PROGRESSIVE_COMMANDS:
+        raise ValueError(f"Unknown streaming command: {command}")
+    
+    governor = get_governor()
+    governor.apply_priority()
+    before = governor.stats()
+    start = time.perf_counter()
+    failed = True
+    throttling = None
+    try:
+        with governor.request(), (timings or NULL_TIMINGS).span('stream'):
+            yield from _stream_records(command, path, output, dict(options or {}),
+                                       timings if timings is not None else NULL_TIMINGS)
+        failed = False
+    finally:
+        if governor.enabled:
+            throttling = _throttling(governor, before, timings)
+        METRICS.record(command, time.perf_counter() - start, failed, timings)
+    
+    if throttling is not None:
+        yield dict(throttling, type='throttling')
+    if timings is not None:
+        yield dict(timings.as_dict(), type='timing')
+
+
+def _throttling(governor: ResourceGovernor, before: Dict[str, Any],
+                timings: Optional[Timings]) -> Dict[str, Any]:
+    """Throttling applied since ``before``, also added to the timing counters
+    
+    Counters are per process, so requests running concurrently in one
+    process see each other's throttling.
+    """
+    after = governor.stats()
+    throttling = {name: round(after[name] - before[name], 3) for name in ResourceGovernor.STAT_NAMES}
+    if timings is not None:
+        for name, value in throttling.items():
+            if value:
+                timings.count(f'throttle_{name}', int(round(value)))
+    return dict(throttling, limits=governor.limits)
+
+
+def _stream_records(command: str, path: str, output: Optional[str], options: Dict[str, Any],
+                    timings: Timings) -> Iterator[Dict[str, Any]]:
+    """Record generator for a streaming command"""
+    if command == 'thumbnail':
+        return ImageProcessor(timings, **options).progressive_thumbnail(path, output)
+    if command == 'thumbnails':
+        return _progressive_thumbnails(path, output, options, timings)
+    
+    cache_path = DigestCache.resolve_path(options.pop('hash_cache', None))
+    hasher = ContentHasher(cache=DigestCache(cache_path) if cache_path else None, timings=timings)
+    if command == 'manifest':
+        return ManifestBuilder(hasher=hasher).build(path, **options)
+    return hasher.hash_paths(path, **options)
+
+
+def _dispatch(command: str, path: str, output: Optional[str], options: Dict[str, Any],
+              timings: Timings) -> Dict[str, Any]:
+    """Run a command with processors sharing the given timings"""
+    file_manager = FileManager(timings)
     
     if command == 'list':
-        return file_manager.list_directory(path)
+        return file_manager.list_directory(path, **options)
     elif command == 'thumbnail':
-        return image_processor.create_thumbnail(path, output)
+        # Encoder options configure the processor rather than the call
+        return ImageProcessor(timings, **options).create_thumbnail(path, output)
+    elif command == 'thumbnails':
+        return _create_thumbnails(path, output, options, timings)
     elif command == 'metadata':
         return file_manager.get_metadata(path)
+    elif command == 'sequence':
+        return SequenceProcessor().create_preview(path, output, **options)
+    elif command == 'aggregate':
+        from frame_aggregator import FrameAggregator
+        return FrameAggregator().aggregate(path, output, **options)
+    elif command == 'manifest':
+        records = list(_stream_records(command, path, None, dict(options), timings))
+        return {'header': records[0], 'files': records[1:-1], 'summary': records[-1]}
+    elif command == 'hash':
+        records = list(_stream_records(command, path, None, dict(options), timings))
+        return {'files': records[:-1], 'summary': records[-1]}
     else:
         raise ValueError(f"Unknown command: {command}")
 
 
+def _create_thumbnails(path: str, output_dir: Optional[str], options: Dict[str, Any],
+                       timings: Timings) -> Dict[str, Any]:
+    """Select images in a directory and thumbnail them in parallel"""
+    listing, image_paths, options, workers = _select_images(path, options, timings)
+    results = ImageProcessor(timings, **options).create_thumbnails(image_paths, output_dir, workers)
+    return {
+        'path': listing['path'],
+        'total': listing['total'],
+        'count': len(results),
+        'results': results
+    }
+
+
+def _progressive_thumbnails(path: str, output_dir: Optional[str], options: Dict[str, Any],
+                            timings: Timings) -> Iterator[Dict[str, Any]]:
+    """Stream a listing record, previews of the selected images and then refined thumbnails"""
+    listing, image_paths, options, workers = _select_images(path, options, timings)
+    yield {'type': 'listing', 'path': listing['path'], 'total': listing['total'], 'count': len(image_paths),
+           'paths': image_paths}
+    yield from ImageProcessor(timings, **options).progressive_thumbnails(image_paths, output_dir, workers)
+
+
+def _select_images(path: str, options: Dict[str, Any], timings: Timings) -> tuple:
+    """List the images a thumbnails command covers
+    
+    Returns the listing, the selected image paths, the remaining encoder
+    options and the worker count.
+    """
+    options = dict(options)
+    selection = dict(options.pop('selection', {}))
+    workers = options.pop('workers', None)
+    selection.setdefault('sort_by', 'natural')
+    selection.setdefault('extensions', sorted(FileManager.SUPPORTED_IMAGE_EXTENSIONS))
+    
+    listing = FileManager(timings).list_directory(path, **selection)
+    image_paths = [item['path'] for item in listing['items'] if item.get('type') == 'file']
+    return listing, image_paths, options, workers
+
+
 if __name__ == '__main__':
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+Manifest Module
+Streaming directory manifests and diffs for incremental mirroring
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
+from pathlib import Path
+
+from content_hasher import ContentHasher, walk_files
+from resource_governor import get_governor, bounded_map
+
+
+class ManifestBuilder:
+    """Builds path/size/mtime(/hash) manifests and diffs them against earlier ones
+    
+    Records are yielded one at a time so callers can stream them as NDJSON:
+    a ``header`` record, one ``file`` record per regular file (paths relative
+    to the root, in walk order) and a closing ``summary`` record.
+    """
+    
+    HASH_ALGORITHMS = ContentHasher.HASH_ALGORITHMS
+    DEFAULT_HASH_ALGORITHM = ContentHasher.DEFAULT_HASH_ALGORITHM
+    
+    def __init__(self, max_workers: Optional[int] = None, hasher: Optional[ContentHasher] = None):
+        self.max_workers = get_governor().pool_size(max_workers, per_cpu=2)
+        self.hasher = hasher or ContentHasher(self.max_workers)
+    
+    def build(self, root_path: str, hash_algorithm: Optional[str] = None,
+              previous_manifest: Optional[str] = None,
+              include_unchanged: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield manifest records for every regular file under root_path
+        
+        With ``hash_algorithm`` file contents are hashed in a thread pool,
+        keeping at most ``2 * max_workers`` files in flight while preserving
+        walk order. With ``previous_manifest`` each file record gains a
+        ``status`` (``added``, ``modified`` or ``unchanged``), unchanged files
+        are omitted unless ``include_unchanged`` is set, and files missing
+        from the tree are reported as ``removed`` before the summary. Files
+        whose size and mtime match the previous manifest reuse its hash
+        instead of being read again, as do files found in the hasher's
+        digest cache.
+        """
+        root = Path(root_path)
+        if not root.exists():
+            raise FileNotFoundError(f"Directory not found: {root_path}")
+        if not root.is_dir():
+            raise NotADirectoryError(f"Path is not a directory: {root_path}")
+        if hash_algorithm is not None and hash_algorithm not in self.HASH_ALGORITHMS:
+            raise ValueError(f"Unknown hash algorithm: {hash_algorithm}")
+        
+        previous, previous_algorithm = (self._load_manifest(previous_manifest) if previous_manifest
+                                        else (None, None))
+        # Earlier hashes are only reusable and comparable with the same algorithm
+        comparable_hashes = hash_algorithm is not None and previous_algorithm == hash_algorithm
+        summary = {'type': 'summary', 'files': 0, 'bytes': 0, 'hashed_bytes': 0, 'errors': 0}
+        if previous is not None:
+            summary.update({'added': 0, 'modified': 0, 'unchanged': 0, 'removed': 0})
+        
+        yield {
+            'type': 'header',
+            'root': str(root.absolute()),
+            'created': time.time(),
+            'hash_algorithm': hash_algorithm,
+            'diff_against': previous_manifest
+        }
+        
+        seen = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def submit(item: Tuple[str, os.stat_result]) -> Union[Dict[str, Any], Future]:
+                """File record, or a Future of it when the file must be hashed"""
+                relative, stat_info = item
+                seen.add(relative)
+                record = {
+                    'type': 'file',
+                    'path': relative,
+                    'size': stat_info.st_size,
+                    'mtime': stat_info.st_mtime
+                }
+                if hash_algorithm is not None:
+                    earlier = previous.get(relative) if previous is not None else None
+                    if (comparable_hashes and earlier is not None and earlier.get('hash')
+                            and self._same_metadata(record, earlier)):
+                        record['hash'] = earlier['hash']
+                    else:
+                        return executor.submit(self._hash_record, root / relative, record,
+                                               stat_info, hash_algorithm)
+                return record
+            
+            def finish(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+                if record.pop('_read', False):
+                    summary['hashed_bytes'] += record['size']
+                summary['files'] += 1
+                summary['bytes'] += record['size']
+                if 'error' in record:
+                    summary['errors'] += 1
+                if previous is None:
+                    return record
+                record['status'] = self._compare(record, previous.get(record['path']), comparable_hashes)
+                summary[record['status']] += 1
+                if record['status'] == 'unchanged' and not include_unchanged:
+                    return None
+                return record
+            
+            for _, record in bounded_map(submit, walk_files(root), self.max_workers * 2):
+                finished = finish(record)
+                if finished is not None:
+                    yield finished
+        
+        if previous is not None:
+            for relative in sorted(set(previous) - seen):
+                summary['removed'] += 1
+                yield dict(previous[relative], status='removed')
+        
+        yield summary
+    
+    def _hash_record(self, path: Path, record: Dict[str, Any], stat_info: os.stat_result,
+                     hash_algorithm: str) -> Dict[str, Any]:
+        """Add the content hash to a record, recording read errors instead of raising"""
+        try:
+            record['hash'], cached = self.hasher.hash_file(path, hash_algorithm, stat_info)
+            record['_read'] = not cached
+        except OSError as e:
+            record['error'] = str(e)
+        return record
+    
+    def _load_manifest(self, manifest_path: str) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        """Read the file records of an NDJSON manifest keyed by relative path
+        
+        Returns the records and the manifest's hash algorithm. Records marked
+        ``removed`` by an earlier diff are ignored.
+        """
+        records = {}
+        hash_algorithm = None
+        with open(manifest_path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid manifest line {line_number} in {manifest_path}: {str(e)}")
+                if record.get('type') == 'header':
+                    hash_algorithm = record.get('hash_algorithm')
+                elif record.get('type') == 'file' and record.get('status') != 'removed':
+                    record.pop('status', None)
+                    records[record['path']] = record
+        return records, hash_algorithm
+    
+    def _same_metadata(self, record: Dict[str, Any], earlier: Dict[str, Any]) -> bool:
+        """Whether size and mtime match the earlier record"""
+        return record['size'] == earlier.get('size') and record['mtime'] == earlier.get('mtime')
+    
+    def _compare(self, record: Dict[str, Any], earlier: Optional[Dict[str, Any]],
+                 comparable_hashes: bool) -> str:
+        """Classify a file against its previous manifest record"""
+        if earlier is None:
+            return 'added'
+        if comparable_hashes and 'hash' in record and earlier.get('hash'):
+            same = record['hash'] == earlier['hash'] and record['size'] == earlier.get('size')
+        else:
+            same = self._same_metadata(record, earlier)
+        return 'unchanged' if same else 'modified'
@@ -0,0 +1,332 @@
+"""
+Resource Governor Module
+Limits on agent worker counts, CPU/IO priority, read bandwidth and concurrent requests
+"""
+
+import os
+import sys
+import time
+import ctypes
+import logging
+import platform
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ioprio_set(2) syscall numbers; Python's os module has no wrapper
+_IOPRIO_SET_SYSCALLS = {'x86_64': 251, 'aarch64': 30, 'i386': 289, 'i686': 289, 'armv7l': 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+
+class TokenBucket:
+    """Thread-safe token bucket pacing byte consumption to ``rate`` per second
+    
+    Callers reserve tokens up front and sleep off any deficit outside the
+    lock, so concurrent readers share the rate fairly and a request larger
+    than the burst is paced instead of rejected.
+    """
+    
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def consume(self, amount: float) -> float:
+        """Take amount tokens, sleeping until they are available; returns seconds waited"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class ResourceGovernor:
+    """Enforces configurable resource limits for every agent execution path
+    
+    * ``max_workers`` caps every process and thread pool the agent starts.
+    * ``nice`` and ``ionice`` lower the CPU and I/O priority of the agent
+      process; pool workers inherit them.
+    * ``read_bandwidth`` (bytes per second) paces file reads through a token
+      bucket; process-pool workers each get an equal share.
+    * ``max_in_flight`` bounds concurrent requests across all agent
+      processes on the host with ``flock``-ed slot files in ``slot_dir``.
+    
+    Unset limits are not enforced. Throttling is counted and reported
+    through ``stats``.
+    """
+    
+    IONICE_CLASSES = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+    ENVIRONMENT = {
+        'max_workers': ('RRV_AGENT_MAX_WORKERS', int),
+        'nice': ('RRV_AGENT_NICE', int),
+        'ionice': ('RRV_AGENT_IONICE', str),
+        'read_bandwidth': ('RRV_AGENT_READ_BANDWIDTH', float),
+        'max_in_flight': ('RRV_AGENT_MAX_IN_FLIGHT', int),
+        'slot_dir': ('RRV_AGENT_SLOT_DIR', str),
+        'slot_timeout': ('RRV_AGENT_SLOT_TIMEOUT', float)
+    }
+    DEFAULT_SLOT_DIR = os.path.join(tempfile.gettempdir(), 'rrv-agent-slots')
+    DEFAULT_SLOT_TIMEOUT = 30.0
+    DEFAULT_POOL_SIZE = 8
+    STAT_NAMES = ('read_bytes', 'read_wait_ms', 'slot_wait_ms', 'slots_timed_out', 'workers_capped')
+    
+    def __init__(self, max_workers: Optional[int] = None, nice: Optional[int] = None,
+                 ionice: Optional[str] = None, read_bandwidth: Optional[float] = None,
+                 max_in_flight: Optional[int] = None, slot_dir: Optional[str] = None,
+                 slot_timeout: Optional[float] = None):
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be positive")
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be positive")
+        if ionice is not None and ionice not in self.IONICE_CLASSES:
+            raise ValueError(f"Unknown ionice class: {ionice}")
+        self.max_workers = max_workers
+        self.nice = nice
+        self.ionice = ionice
+        self.read_bandwidth = read_bandwidth
+        self.max_in_flight = max_in_flight
+        self.slot_dir = slot_dir or self.DEFAULT_SLOT_DIR
+        self.slot_timeout = slot_timeout if slot_timeout is not None else self.DEFAULT_SLOT_TIMEOUT
+        self._bucket = TokenBucket(read_bandwidth) if read_bandwidth else None
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(self.STAT_NAMES, 0)
+        self._priority_applied = False
+        # Fallback bound for platforms without flock (this process only)
+        self._local_slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+    
+    @classmethod
+    def from_environment(cls, **overrides) -> 'ResourceGovernor':
+        """Build a governor from RRV_AGENT_* variables, with non-None overrides taking precedence"""
+        settings = {}
+        for name, (variable, convert) in cls.ENVIRONMENT.items():
+            value = os.environ.get(variable)
+            if value:
+                try:
+                    settings[name] = convert(value)
+                except ValueError:
+                    raise ValueError(f"Invalid value for {variable}: {value}")
+        settings.update({name: value for name, value in overrides.items() if value is not None})
+        return cls(**settings)
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether any limit is configured"""
+        return any(value is not None for value in (self.max_workers, self.nice, self.ionice,
+                                                   self.read_bandwidth, self.max_in_flight))
+    
+    @property
+    def limits(self) -> Dict[str, Any]:
+        return {
+            'max_workers': self.max_workers,
+            'nice': self.nice,
+            'ionice': self.ionice,
+            'read_bandwidth': self.read_bandwidth,
+            'max_in_flight': self.max_in_flight
+        }
+    
+    def worker_limit(self, requested: int) -> int:
+        """Cap a pool size at max_workers"""
+        if self.max_workers is None or requested <= self.max_workers:
+            return requested
+        self._add('workers_capped', 1)
+        return self.max_workers
+    
+    def pool_size(self, requested: Optional[int] = None, per_cpu: int = 1) -> int:
+        """Workers for a new pool: requested, else per_cpu per CPU up to DEFAULT_POOL_SIZE, capped at max_workers
+        
+        I/O-bound thread pools pass ``per_cpu=2`` to overlap reads with hashing.
+        """
+        return self.worker_limit(requested or min(self.DEFAULT_POOL_SIZE, (os.cpu_count() or 1) * per_cpu))
+    
+    def worker_settings(self, workers: int) -> Dict[str, Any]:
+        """Settings for a pool worker process: an equal share of the read bandwidth"""
+        settings = self.limits
+        del settings['max_in_flight']
+        if self.read_bandwidth:
+            settings['read_bandwidth'] = self.read_bandwidth / max(1, workers)
+        return settings
+    
+    def throttle_read(self, nbytes: int) -> None:
+        """Account for a read of nbytes, sleeping if it exceeds the bandwidth limit"""
+        if self._bucket is None or nbytes <= 0:
+            return
+        waited = self._bucket.consume(nbytes)
+        with self._lock:
+            self._stats['read_bytes'] += nbytes
+            self._stats['read_wait_ms'] += waited * 1000
+    
+    def apply_priority(self) -> None:
+        """Lower this process's CPU and I/O priority once; children inherit both"""
+        if self._priority_applied:
+            return
+        self._priority_applied = True
+        if self.nice is not None and hasattr(os, 'nice'):
+            # Unprivileged processes can only raise their niceness
+            increment = self.nice - os.nice(0)
+            if increment > 0:
+                os.nice(increment)
+        if self.ionice is not None:
+            self._apply_ionice(self.IONICE_CLASSES[self.ionice])
+    
+    @contextmanager
+    def request(self) -> Iterator[None]:
+        """Hold one of max_in_flight request slots for the enclosed block"""
+        if self.max_in_flight is None:
+            yield
+            return
+        start = time.monotonic()
+        slot = self._acquire_slot()
+        self._add('slot_wait_ms', (time.monotonic() - start) * 1000)
+        try:
+            yield
+        finally:
+            self._release_slot(slot)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cumulative throttling counters for this process"""
+        with self._lock:
+            return {name: round(value, 3) if isinstance(value, float) else value
+                    for name, value in self._stats.items()}
+    
+    def drain_stats(self) -> Dict[str, Any]:
+        """Return and reset the counters (used by pool workers to report back)"""
+        with self._lock:
+            stats = dict(self._stats)
+            self._stats = dict.fromkeys(self.STAT_NAMES, 0)
+        return stats
+    
+    def merge(self, stats: Optional[Dict[str, Any]]) -> None:
+        """Add counters drained in a pool worker"""
+        if not stats:
+            return
+        with self._lock:
+            for name, value in stats.items():
+                if name in self._stats:
+                    self._stats[name] += value
+    
+    def _add(self, name: str, value: float) -> None:
+        with self._lock:
+            self._stats[name] += value
+    
+    def _acquire_slot(self):
+        if fcntl is None:
+            if not self._local_slots.acquire(timeout=self.slot_timeout):
+                self._add('slots_timed_out', 1)
+                raise TimeoutError(f"No request slot free within {self.slot_timeout}s "
+                                   f"(max in flight: {self.max_in_flight})")
+            return None
+        
+        os.makedirs(self.slot_dir, exist_ok=True)
+        deadline = time.monotonic() + self.slot_timeout
+        delay = 0.005
+        while True:
+            for index in range(self.max_in_flight):
+                slot = open(os.path.join(self.slot_dir, f'slot-{index}.lock'), 'a')
+                try:
+                    fcntl.flock(slot.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot
+                except BlockingIOError:
+                    slot.close()
+            if time.monotonic() >= deadline:
+                self._add('slots_timed_out', 1)
+                raise TimeoutError(f"No request slot free within {self.slot_timeout}s "
+                                   f"(max in flight: {self.max_in_flight})")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+    
+    def _release_slot(self, slot) -> None:
+        if slot is None:
+            self._local_slots.release()
+        else:
+            # Closing the descriptor releases the flock
+            slot.close()
+    
+    def _apply_ionice(self, ioprio_class: int) -> None:
+        syscall_number = _IOPRIO_SET_SYSCALLS.get(platform.machine())
+        if not sys.platform.startswith('linux') or syscall_number is None:
+            logger.warning(f"ionice is not supported on {sys.platform}/{platform.machine()}")
+            return
+        libc = ctypes.CDLL(None, use_errno=True)
+        # Level 7 (lowest) within the class; ignored for the idle class
+        priority = (ioprio_class << _IOPRIO_CLASS_SHIFT) | 7
+        if libc.syscall(syscall_number, _IOPRIO_WHO_PROCESS, 0, priority) != 0:
+            logger.warning(f"Failed to set I/O priority: {os.strerror(ctypes.get_errno())}")
+
+
+# Governor of this process; built from the environment on first use unless
+# main() or a pool worker initializer installs one
+_governor: Optional[ResourceGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> ResourceGovernor:
+    """Return this process's governor, building it from RRV_AGENT_* on first use
+    
+    Callers embedding ``execute_command`` without ``main()`` get the
+    environment's limits too. Invalid variables raise ValueError on every
+    call until fixed, rather than silently disabling the limits.
+    """
+    global _governor
+    governor = _governor
+    if governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = ResourceGovernor.from_environment()
+            governor = _governor
+    return governor
+
+
+def set_governor(governor: Optional[ResourceGovernor]) -> None:
+    """Install a governor; None rebuilds it from the environment on next use"""
+    global _governor
+    _governor = governor
+
+
+def bounded_map(submit: Callable[[Any], Any], items: Iterable[Any],
+                limit: int) -> Iterator[Tuple[Any, Any]]:
+    """Yield (item, result) in input order with at most limit items submitted ahead
+    
+    ``submit`` starts work for an item and returns a Future, whose result is
+    awaited before it is yielded, or an already finished value. Items are
+    pulled lazily, so a long input never has more than ``limit`` results
+    held in memory.
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= limit:
+            yield _resolved(pending.popleft())
+        pending.append((item, submit(item)))
+    while pending:
+        yield _resolved(pending.popleft())
+
+
+def _resolved(entry: Tuple[Any, Any]) -> Tuple[Any, Any]:
+    item, value = entry
+    return item, value.result() if isinstance(value, Future) else value
+
+
+def init_worker(settings: Dict[str, Any]) -> None:
+    """Process pool initializer installing a worker's share of the limits"""
+    governor = ResourceGovernor(**settings)
+    # Already inherited with fork; needed with the spawn start method
+    governor.apply_priority()
+    set_governor(governor)
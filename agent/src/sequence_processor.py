@@ -0,0 +1,206 @@
+"""
+Sequence Processor Module
+Detects numbered frame sequences and renders animated previews
+"""
+
+import io
+import os
+import re
+import mmap
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+from PIL import Image
+
+from image_processor import ImageProcessor
+from resource_governor import get_governor, bounded_map
+
+logger = logging.getLogger(__name__)
+
+# Last run of digits before the extension: frame_000123.raw -> ('frame_', '000123', '.raw')
+FRAME_NAME_RE = re.compile(r'^(.*?)(\d+)(\.[^.]+)$')
+
+
+class SequenceProcessor:
+    """Handles numbered frame sequences (frame_000001.raw, frame_000002.raw, ...)"""
+    
+    PREVIEW_SIZE = ImageProcessor.THUMBNAIL_SIZE
+    CLIP_FORMATS = ('gif', 'webp')
+    DEFAULT_MAX_FRAMES = 100
+    DEFAULT_FPS = 10
+    FRAME_EXTENSIONS = {'.raw', '.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif', '.webp'}
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = get_governor().pool_size(max_workers)
+        self.image_processor = ImageProcessor()
+    
+    def detect_sequences(self, directory_path: str) -> List[Dict[str, Any]]:
+        """Group numbered image files in a directory into sequences, longest first"""
+        path = Path(directory_path)
+        if not path.is_dir():
+            raise NotADirectoryError(f"Path is not a directory: {directory_path}")
+        
+        groups: Dict[Tuple[str, str], List[Tuple[int, str, int]]] = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                match = FRAME_NAME_RE.match(entry.name)
+                if not match:
+                    continue
+                prefix, digits, suffix = match.groups()
+                if suffix.lower() not in self.FRAME_EXTENSIONS:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                groups.setdefault((prefix, suffix), []).append((int(digits), entry.name, len(digits)))
+        
+        sequences = []
+        for (prefix, suffix), frames in groups.items():
+            if len(frames) < 2:
+                continue
+            frames.sort()
+            # Zero padded only if every frame number has the same width
+            widths = {width for _, _, width in frames}
+            padding = widths.pop() if len(widths) == 1 else 0
+            start, end = frames[0][0], frames[-1][0]
+            sequences.append({
+                'id': f"{prefix}%{'0' + str(padding) if padding else ''}d{suffix}",
+                'prefix': prefix,
+                'suffix': suffix,
+                'start': start,
+                'end': end,
+                'count': len(frames),
+                'missing': (end - start + 1) - len(frames),
+                'frames': [name for _, name, _ in frames]
+            })
+        
+        sequences.sort(key=lambda seq: (-seq['count'], seq['id']))
+        return sequences
+    
+    def create_preview(self, directory_path: str, output_path: Optional[str] = None,
+                       sequence_id: Optional[str] = None, max_frames: int = DEFAULT_MAX_FRAMES,
+                       step: Optional[int] = None, fps: float = DEFAULT_FPS,
+                       clip_format: str = 'gif', buffer_frames: Optional[int] = None) -> Dict[str, Any]:
+        """Render a downsampled animated preview of a frame sequence
+        
+        Frames are sampled evenly (or every ``step`` frames) up to
+        ``max_frames``, decoded in a thread pool from memory-mapped files and
+        collected through a ring buffer of at most ``buffer_frames`` in-flight
+        decodes, so only the small preview frames are ever held in memory.
+        Without ``sequence_id`` the longest sequence in the directory is used.
+        """
+        try:
+            if clip_format not in self.CLIP_FORMATS:
+                raise ValueError(f"Unknown clip format: {clip_format}")
+            if max_frames < 1 or fps <= 0 or (step is not None and step < 1):
+                raise ValueError("max_frames, fps and step must be positive")
+            
+            sequences = self.detect_sequences(directory_path)
+            if not sequences:
+                raise ValueError(f"No numbered frame sequences found in {directory_path}")
+            
+            if sequence_id is None:
+                sequence = sequences[0]
+            else:
+                sequence = next((seq for seq in sequences if seq['id'] == sequence_id), None)
+                if sequence is None:
+                    raise ValueError(f"Sequence not found: {sequence_id}")
+            
+            frame_names = self._sample_frames(sequence['frames'], max_frames, step)
+            base = Path(directory_path)
+            frames = self._decode_frames([base / name for name in frame_names],
+                                         buffer_frames or self.max_workers * 2)
+            if not frames:
+                raise ValueError(f"No decodable frames in sequence {sequence['id']}")
+            
+            # Animated formats need a single canvas size
+            canvas_size = frames[0].size
+            frames = [frame if frame.size == canvas_size else frame.resize(canvas_size, Image.Resampling.BILINEAR)
+                      for frame in frames]
+            
+            buffer = io.BytesIO()
+            save_options = {
+                'save_all': True,
+                'append_images': frames[1:],
+                'duration': int(round(1000 / fps)),
+                'loop': 0
+            }
+            if clip_format == 'webp':
+                frames[0].save(buffer, format='WEBP', quality=70, method=0, **save_options)
+            else:
+                frames[0].save(buffer, format='GIF', **save_options)
+            
+            summary = {key: value for key, value in sequence.items() if key != 'frames'}
+            result = {
+                'success': True,
+                'sequence': summary,
+                'sequences': [seq['id'] for seq in sequences],
+                'frame_count': len(frames),
+                'skipped_frames': len(frame_names) - len(frames),
+                'frame_size': canvas_size,
+                'fps': fps,
+                'format': clip_format
+            }
+            if output_path:
+                with open(output_path, 'wb') as f:
+                    f.write(buffer.getvalue())
+                result['output_path'] = output_path
+            else:
+                result['preview_base64'] = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            return result
+        
+        except Exception as e:
+            logger.error(f"Failed to create sequence preview for {directory_path}: {str(e)}")
+            raise Exception(f"Sequence preview failed: {str(e)}")
+    
+    def _sample_frames(self, frames: List[str], max_frames: int, step: Optional[int]) -> List[str]:
+        """Pick evenly spaced frames (or every step-th frame) up to max_frames"""
+        if step is None:
+            step = max(1, -(-len(frames) // max_frames))
+        return frames[::step][:max_frames]
+    
+    def _decode_frames(self, paths: List[Path], buffer_frames: int) -> List[Image.Image]:
+        """Decode frames in parallel, keeping at most buffer_frames decodes in flight"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            decoded = bounded_map(lambda path: executor.submit(self._decode_frame, path), paths, buffer_frames)
+            return [frame for _, frame in decoded if frame is not None]
+    
+    def _decode_frame(self, path: Path) -> Optional[Image.Image]:
+        """Decode one frame into a preview-sized grayscale or RGB image"""
+        try:
+            if path.suffix.lower() == '.raw':
+                return self._decode_raw_frame(path)
+            img, _ = self.image_processor._open_bounded(path, self.PREVIEW_SIZE)
+            with img:
+                img.draft('RGB', self.PREVIEW_SIZE)
+                if img.mode not in ('L', 'RGB'):
+                    img = img.convert('RGB')
+                img.thumbnail(self.PREVIEW_SIZE, Image.Resampling.BILINEAR)
+                return img.copy()
+        except Exception as e:
+            logger.warning(f"Skipping undecodable frame {path}: {str(e)}")
+            return None
+    
+    def _decode_raw_frame(self, path: Path) -> Optional[Image.Image]:
+        """Decode a RAW frame from a memory map, box-reducing before any copy"""
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            width, height = self.image_processor._get_raw_dimensions(file_size)
+            if not width or not height:
+                logger.warning(f"Skipping invalid RAW frame: {path} (size: {file_size})")
+                return None
+            
+            get_governor().throttle_read(file_size)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                full = Image.frombuffer('L', (width, height), mapped, 'raw', 'L', 0, 1)
+                factor = max(1, min(width // self.PREVIEW_SIZE[0], height // self.PREVIEW_SIZE[1]))
+                frame = full.reduce(factor) if factor > 1 else full.copy()
+                # Release the view on the map before it is closed
+                del full
+        
+        frame.thumbnail(self.PREVIEW_SIZE, Image.Resampling.BILINEAR)
+        return frame
@@ -0,0 +1,86 @@
+"""
+Shared Memory Pool Module
+Recycled multiprocessing.shared_memory slabs for passing buffers between worker processes
+"""
+
+import queue
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+# Slabs attached by name in this process (workers reuse them across tasks)
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def attach_slab(name: str) -> memoryview:
+    """Return a writable view of a slab created by a SharedBufferPool
+    
+    Attachments are cached so a pool worker maps each slab only once. Workers
+    are children of the pool owner and share its resource tracker, which owns
+    unlinking the segment.
+    """
+    slab = _attached.get(name)
+    if slab is None:
+        slab = _attached[name] = shared_memory.SharedMemory(name=name)
+    return slab.buf
+
+
+class SharedBufferPool:
+    """Fixed set of equally sized shared memory slabs handed out and recycled
+    
+    The owner acquires a slab name, passes it to a worker task which writes
+    its output with ``attach_slab``, reads the result through ``view`` and
+    releases the slab for the next task. Because slabs are only recycled after
+    release, the pool size also bounds the number of tasks in flight.
+    """
+    
+    def __init__(self, slab_size: int, count: int):
+        if slab_size < 1 or count < 1:
+            raise ValueError("slab_size and count must be positive")
+        self.slab_size = slab_size
+        self._slabs: Dict[str, shared_memory.SharedMemory] = {}
+        self._free: "queue.Queue[str]" = queue.Queue()
+        try:
+            for _ in range(count):
+                slab = shared_memory.SharedMemory(create=True, size=slab_size)
+                self._slabs[slab.name] = slab
+                self._free.put(slab.name)
+        except Exception:
+            self.close()
+            raise
+    
+    def acquire(self, timeout: Optional[float] = None) -> str:
+        """Take a free slab, blocking until one is released"""
+        return self._free.get(timeout=timeout)
+    
+    def release(self, name: str) -> None:
+        """Return a slab to the pool"""
+        if name not in self._slabs:
+            raise KeyError(f"Unknown slab: {name}")
+        self._free.put(name)
+    
+    def view(self, name: str, length: Optional[int] = None) -> memoryview:
+        """View of the first ``length`` bytes of a slab (the whole slab by default)"""
+        buf = self._slabs[name].buf
+        return buf if length is None else buf[:length]
+    
+    @property
+    def names(self) -> List[str]:
+        """Names of every slab in the pool"""
+        return list(self._slabs)
+    
+    def close(self) -> None:
+        """Close and unlink every slab"""
+        for slab in self._slabs.values():
+            try:
+                slab.close()
+            except BufferError:
+                # A view is still exported; the segment is freed when it goes away
+                pass
+            slab.unlink()
+        self._slabs.clear()
+    
+    def __enter__(self) -> 'SharedBufferPool':
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,116 @@
+import unittest
+import tempfile
+import hashlib
+import os
+from pathlib import Path
+import sys
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from content_hasher import ContentHasher, DigestCache
+
+
+class TestContentHasher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = Path(self.temp_dir) / 'tree'
+        (self.root / 'sub').mkdir(parents=True)
+        (self.root / 'a.raw').write_bytes(b'a' * 100)
+        (self.root / 'sub' / 'b.raw').write_bytes(b'b' * 200)
+        (self.root / 'sub' / 'c.txt').write_bytes(b'c')
+        self.hasher = ContentHasher(max_workers=2, cache=DigestCache())
+    
+    def tearDown(self):
+        # Clean up temp directory
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def test_hash_directory(self):
+        """Test digests match hashlib and are yielded in walk order"""
+        records = list(self.hasher.hash_paths(str(self.root), 'sha256'))
+        
+        self.assertEqual([r['path'] for r in records[:-1]], ['a.raw', 'sub/b.raw', 'sub/c.txt'])
+        self.assertEqual(records[1]['hash'], hashlib.sha256(b'b' * 200).hexdigest())
+        self.assertEqual(records[-1]['files'], 3)
+        self.assertEqual(records[-1]['bytes_read'], 301)
+    
+    def test_hash_single_file_with_pattern(self):
+        """Test hashing one file and filtering a directory by name pattern"""
+        single = list(self.hasher.hash_paths(str(self.root / 'a.raw')))
+        filtered = list(self.hasher.hash_paths(str(self.root), pattern='*.raw'))
+        
+        self.assertEqual(single[0]['path'], 'a.raw')
+        self.assertEqual(single[0]['hash'], hashlib.blake2b(b'a' * 100).hexdigest())
+        self.assertEqual([r['path'] for r in filtered[:-1]], ['a.raw', 'sub/b.raw'])
+    
+    def test_cache_skips_unchanged_files(self):
+        """Test unchanged files are served from the cache without reading"""
+        list(self.hasher.hash_paths(str(self.root)))
+        (self.root / 'a.raw').write_bytes(b'x' * 101)
+        
+        with patch.object(ContentHasher, '_digest', wraps=self.hasher._digest) as mock_digest:
+            records = list(self.hasher.hash_paths(str(self.root)))
+        
+        self.assertEqual(mock_digest.call_count, 1)
+        self.assertEqual([r['cached'] for r in records[:-1]], [False, True, True])
+        self.assertEqual(records[0]['hash'], hashlib.blake2b(b'x' * 101).hexdigest())
+        self.assertEqual(records[-1]['cache_hits'], 2)
+    
+    def test_cache_file_persists(self):
+        """Test a cache file is reused by a new hasher"""
+        cache_path = os.path.join(self.temp_dir, 'digests.json')
+        list(ContentHasher(cache=DigestCache(cache_path)).hash_paths(str(self.root)))
+        
+        records = list(ContentHasher(cache=DigestCache(cache_path)).hash_paths(str(self.root)))
+        
+        self.assertEqual(records[-1]['cache_hits'], 3)
+        self.assertEqual(records[-1]['bytes_read'], 0)
+    
+    def test_cache_path_defaults_to_persisted_file(self):
+        """Test the cache is persisted by default, configurable and can be turned off"""
+        configured = os.path.join(self.temp_dir, 'env.json')
+        with patch.dict(os.environ, {DigestCache.ENVIRONMENT_VARIABLE: ''}):
+            self.assertEqual(DigestCache.resolve_path(), DigestCache.DEFAULT_PATH)
+            self.assertEqual(DigestCache.resolve_path('explicit.json'), 'explicit.json')
+            self.assertIsNone(DigestCache.resolve_path('none'))
+        with patch.dict(os.environ, {DigestCache.ENVIRONMENT_VARIABLE: configured}):
+            self.assertEqual(DigestCache.resolve_path(), configured)
+        with patch.dict(os.environ, {DigestCache.ENVIRONMENT_VARIABLE: 'none'}):
+            self.assertIsNone(DigestCache.resolve_path())
+    
+    def test_cache_file_of_another_user_is_ignored(self):
+        """Test a cache file not owned by this user is not trusted"""
+        cache_path = os.path.join(self.temp_dir, 'digests.json')
+        list(ContentHasher(cache=DigestCache(cache_path)).hash_paths(str(self.root)))
+        
+        with patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertEqual(len(DigestCache(cache_path)), 0)
+    
+    def test_mmap_digest(self):
+        """Test files above the mmap threshold hash identically"""
+        data = os.urandom(3000)
+        path = self.root / 'large.bin'
+        path.write_bytes(data)
+        self.hasher.MMAP_THRESHOLD = 1024
+        self.hasher.MMAP_CHUNK_SIZE = 1000
+        
+        digest, cached = self.hasher.hash_file(path, 'md5')
+        
+        self.assertFalse(cached)
+        self.assertEqual(digest, hashlib.md5(data).hexdigest())
+    
+    def test_hash_unknown_algorithm(self):
+        """Test an unsupported algorithm is rejected"""
+        with self.assertRaises(ValueError):
+            list(self.hasher.hash_paths(str(self.root), 'crc32'))
+    
+    def test_hash_nonexistent(self):
+        """Test hashing a missing path"""
+        with self.assertRaises(FileNotFoundError):
+            list(self.hasher.hash_paths(os.path.join(self.temp_dir, 'missing')))
+
+
+if __name__ == '__main__':
+    unittest.main()
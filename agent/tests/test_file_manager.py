@@ -3,11 +3,13 @@ import tempfile
 import os
 from pathlib import Path
 import sys
+from unittest.mock import patch
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from file_manager import FileManager
+from file_manager import FileManager, _ListingEntry
+from instrumentation import Timings
 
 
 class TestFileManager(unittest.TestCase):
@@ -51,6 +53,107 @@ class TestFileManager(unittest.TestCase):
             self.assertIn('size', item)
             self.assertEqual(item['type'], 'file')
     
+    def _make_listing_fixture(self):
+        """Create a directory mixing frames, other files and a subdirectory"""
+        base = Path(self.temp_dir)
+        (base / 'subdir').mkdir()
+        for index in (1, 2, 10):
+            (base / f'frame_{index}.raw').write_bytes(b'x' * 10000)
+        (base / 'broken.raw').write_bytes(b'x' * 1234)
+        (base / 'notes.txt').write_text('notes')
+        (base / 'big.png').write_bytes(b'x' * 50000)
+    
+    def test_list_directory_natural_sort(self):
+        """Test natural sort orders numbered frames numerically"""
+        self._make_listing_fixture()
+        result = self.file_manager.list_directory(self.temp_dir, sort_by='natural',
+                                                  extensions=['raw'])
+        names = [item['name'] for item in result['items']]
+        self.assertEqual(names, ['broken.raw', 'frame_1.raw', 'frame_2.raw', 'frame_10.raw'])
+    
+    def test_list_directory_filters(self):
+        """Test glob, regex, size and valid RAW filters"""
+        self._make_listing_fixture()
+        result = self.file_manager.list_directory(self.temp_dir, pattern='FRAME_*')
+        self.assertEqual(result['total'], 3)
+        
+        result = self.file_manager.list_directory(self.temp_dir, regex=r'^frame_\d\.')
+        self.assertEqual({item['name'] for item in result['items']}, {'frame_1.raw', 'frame_2.raw'})
+        
+        result = self.file_manager.list_directory(self.temp_dir, min_size=20000)
+        self.assertEqual([item['name'] for item in result['items']], ['big.png'])
+        
+        result = self.file_manager.list_directory(self.temp_dir, valid_raw_only=True)
+        self.assertEqual(result['total'], 3)
+        self.assertTrue(all(item['raw_info']['valid'] for item in result['items']))
+    
+    def test_list_directory_pagination(self):
+        """Test paginated listing keeps directories first and reports total"""
+        self._make_listing_fixture()
+        result = self.file_manager.list_directory(self.temp_dir, sort_by='size',
+                                                  reverse=True, limit=2)
+        self.assertEqual(result['total'], 7)
+        self.assertEqual([item['name'] for item in result['items']], ['subdir', 'big.png'])
+        
+        full = self.file_manager.list_directory(self.temp_dir, sort_by='natural')
+        paged = self.file_manager.list_directory(self.temp_dir, sort_by='natural', offset=2, limit=3)
+        self.assertEqual(paged['items'], full['items'][2:5])
+    
+    def test_list_directory_limit_zero_counts_everything(self):
+        """Test limit=0 returns no items but still reports the full total"""
+        self._make_listing_fixture()
+        for sort_by in ('name', 'size'):
+            result = self.file_manager.list_directory(self.temp_dir, sort_by=sort_by, limit=0)
+            self.assertEqual(result['total'], 7)
+            self.assertEqual(result['items'], [])
+    
+    def test_list_directory_name_filters_skip_stat(self):
+        """Test name-only filters stat just the returned page, not every entry"""
+        self._make_listing_fixture()
+        timings = Timings()
+        
+        with patch.object(_ListingEntry, 'from_dir_entry', wraps=_ListingEntry.from_dir_entry) as scanned_stat:
+            result = FileManager(timings).list_directory(self.temp_dir, pattern='*.raw', limit=1)
+            self.assertEqual(scanned_stat.call_count, 0)
+            self.assertEqual((result['items'][0]['name'], result['items'][0]['size']), ('broken.raw', 1234))
+            self.assertEqual(timings.counters['entries_stated'], 1)
+            
+            self.file_manager.list_directory(self.temp_dir, pattern='*.raw', sort_by='size')
+            self.assertGreater(scanned_stat.call_count, 0)
+    
+    def test_list_directory_compact_format(self):
+        """Test compact listing matches the full listing column by column"""
+        self._make_listing_fixture()
+        full = self.file_manager.list_directory(self.temp_dir, sort_by='natural')
+        compact = self.file_manager.list_directory(self.temp_dir, sort_by='natural',
+                                                   output_format='compact')
+        columns = compact['columns']
+        self.assertEqual(compact['format'], 'compact')
+        self.assertEqual(compact['count'], len(full['items']))
+        self.assertEqual(columns['name'], [item['name'] for item in full['items']])
+        self.assertEqual(columns['size'], [item['size'] for item in full['items']])
+        
+        for index, item in enumerate(full['items']):
+            self.assertEqual(compact['permission_table'][columns['permissions'][index]], item['permissions'])
+            if item['type'] == 'directory':
+                self.assertEqual(columns['type'][index], 'd')
+                self.assertEqual(columns['extension'][index], -1)
+                continue
+            self.assertEqual(compact['extension_table'][columns['extension'][index]], item['extension'])
+            raw_info = item.get('raw_info')
+            if raw_info and raw_info['valid']:
+                self.assertEqual(columns['raw'][index], [raw_info['width'], raw_info['height']])
+            else:
+                self.assertIsNone(columns['raw'][index])
+        
+        self.assertEqual(len(compact['extension_table']), 3)
+    
+    def test_list_directory_invalid_sort(self):
+        """Test unknown sort keys are rejected"""
+        with self.assertRaises(Exception) as context:
+            self.file_manager.list_directory(self.temp_dir, sort_by='colour')
+        self.assertIn('Unknown sort key', str(context.exception))
+    
     def test_get_metadata_nonexistent_file(self):
         """Test getting metadata for non-existent file"""
         with self.assertRaises(Exception) as context:
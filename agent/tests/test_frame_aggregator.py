@@ -0,0 +1,96 @@
+import unittest
+import tempfile
+import os
+from pathlib import Path
+import sys
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from frame_aggregator import FrameAggregator
+from shm_pool import SharedBufferPool
+
+
+class TestFrameAggregator(unittest.TestCase):
+    def setUp(self):
+        self.aggregator = FrameAggregator(max_workers=1)
+        self.temp_dir = tempfile.mkdtemp()
+        self.rng = np.random.default_rng(0)
+        
+    def tearDown(self):
+        # Clean up temp directory
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def _write_stack(self, count, side=32):
+        """Write count random side x side RAW frames and return them as a stack"""
+        stack = self.rng.integers(0, 256, size=(count, side, side), dtype=np.uint8)
+        for index, frame in enumerate(stack):
+            (Path(self.temp_dir) / f'frame_{index}.raw').write_bytes(frame.tobytes())
+        return stack
+    
+    def _assert_matches_numpy(self, stack):
+        accumulated = self.aggregator._accumulate(
+            [str(Path(self.temp_dir) / f'frame_{i}.raw') for i in range(len(stack))], stack.shape[1:])
+        self.assertEqual(accumulated['count'], len(stack))
+        np.testing.assert_array_equal(accumulated['max'], stack.max(axis=0))
+        np.testing.assert_array_equal(accumulated['min'], stack.min(axis=0))
+        np.testing.assert_allclose(accumulated['sum'] / len(stack), stack.mean(axis=0))
+    
+    def test_accumulate_matches_numpy(self):
+        """Test single-pass accumulation matches direct NumPy reductions"""
+        self._assert_matches_numpy(self._write_stack(10))
+    
+    def test_accumulate_parallel_matches_numpy(self):
+        """Test chunked process pool accumulation merges partials correctly"""
+        self.aggregator = FrameAggregator(max_workers=3)
+        self.aggregator.PARALLEL_THRESHOLD = 4
+        self._assert_matches_numpy(self._write_stack(10))
+    
+    def test_accumulate_parallel_tiles_rows_within_shm_budget(self):
+        """Test accumulators are split into row bands whose slabs fit the shared memory budget"""
+        self.aggregator = FrameAggregator(max_workers=3)
+        self.aggregator.PARALLEL_THRESHOLD = 4
+        self.aggregator.SHM_BUDGET = 32 * 18 * 5 * 3
+        with patch('frame_aggregator.SharedBufferPool', wraps=SharedBufferPool) as mock_pool_class:
+            self._assert_matches_numpy(self._write_stack(10))
+        slab_size, count = mock_pool_class.call_args[0]
+        self.assertEqual(slab_size, 32 * 18 * 5)
+        self.assertLessEqual(slab_size * count, self.aggregator.SHM_BUDGET)
+    
+    def test_aggregate_statistics(self):
+        """Test aggregate reports statistics and thumbnails in natural frame order"""
+        stack = self._write_stack(12)
+        result = self.aggregator.aggregate(self.temp_dir, statistics=['mean', 'std'], max_frames=10)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['frame_count'], 10)
+        self.assertEqual(result['size'], (32, 32))
+        self.assertAlmostEqual(result['statistics']['mean']['mean'], float(stack[:10].mean()))
+        self.assertAlmostEqual(result['statistics']['std']['max'], float(stack[:10].std(axis=0).max()))
+        self.assertEqual(set(result['thumbnails']), {'mean', 'std'})
+    
+    def test_aggregate_skips_mismatched_geometry(self):
+        """Test frames with a different size are skipped"""
+        self._write_stack(3)
+        (Path(self.temp_dir) / 'frame_9.raw').write_bytes(b'x' * 100)
+        output = Path(self.temp_dir) / 'out' / 'stack.png'
+        output.parent.mkdir()
+        
+        result = self.aggregator.aggregate(self.temp_dir, str(output), statistics=['max'])
+        self.assertEqual(result['frame_count'], 3)
+        self.assertEqual(len(result['skipped']), 1)
+        self.assertTrue(Path(result['output_paths']['max']).exists())
+    
+    def test_aggregate_unknown_statistic(self):
+        """Test unknown statistics are rejected"""
+        self._write_stack(2)
+        with self.assertRaises(Exception) as context:
+            self.aggregator.aggregate(self.temp_dir, statistics=['median'])
+        self.assertIn('Unknown statistics', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
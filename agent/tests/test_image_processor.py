@@ -3,11 +3,18 @@ import tempfile
 import os
 from pathlib import Path
 import sys
+import io
+import base64
+import mmap
+from unittest.mock import patch
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+from PIL import Image
 from image_processor import ImageProcessor
+from instrumentation import Timings
+from resource_governor import ResourceGovernor, set_governor
 
 
 class TestImageProcessor(unittest.TestCase):
@@ -20,6 +27,19 @@ class TestImageProcessor(unittest.TestCase):
         import shutil
         shutil.rmtree(self.temp_dir)
     
+    def _write_frames(self, count, invalid=False):
+        """Write count 100x100 RAW frames, plus an undecodable one last if invalid, and return their paths"""
+        paths = []
+        for index in range(count):
+            raw_file = Path(self.temp_dir) / f'frame_{index}.raw'
+            raw_file.write_bytes(bytes([index * 40 % 256]) * 10000)
+            paths.append(str(raw_file))
+        if invalid:
+            invalid_file = Path(self.temp_dir) / 'invalid.raw'
+            invalid_file.write_bytes(b'x' * 1234)
+            paths.append(str(invalid_file))
+        return paths
+    
     def test_get_raw_dimensions_327680_bytes(self):
         """Test RAW dimensions calculation for 327,680 bytes"""
         width, height = self.processor._get_raw_dimensions(327680)
@@ -87,6 +107,234 @@ class TestImageProcessor(unittest.TestCase):
         self.assertIn('thumbnail_base64', result)
         self.assertEqual(result['raw_info']['width'], 100)
         self.assertEqual(result['raw_info']['height'], 100)
+    
+    def test_create_thumbnail_timings(self):
+        """Test thumbnail phases and bytes read are recorded"""
+        raw_file = Path(self.temp_dir) / 'timed.raw'
+        raw_file.write_bytes(b'x' * 327680)
+        timings = Timings()
+        
+        result = ImageProcessor(timings).create_thumbnail(str(raw_file))
+        self.assertTrue(result['success'])
+        report = timings.as_dict()
+        for phase in ('stat', 'read', 'decode', 'resize', 'encode'):
+            self.assertIn(phase, report['spans'])
+        self.assertEqual(report['counters']['bytes_read'], 327680)
+    
+    def _decode_thumbnail(self, result):
+        return Image.open(io.BytesIO(base64.b64decode(result['thumbnail_base64'])))
+    
+    def test_raw_thumbnail_stays_grayscale(self):
+        """Test RAW thumbnails are encoded as single-channel JPEG"""
+        raw_file = Path(self.temp_dir) / 'gray.raw'
+        raw_file.write_bytes(bytes(range(256)) * (327680 // 256))
+        
+        result = self.processor.create_thumbnail(str(raw_file))
+        self.assertEqual(result['mime_type'], 'image/jpeg')
+        self.assertEqual(self._decode_thumbnail(result).mode, 'L')
+    
+    def test_selectable_encoders(self):
+        """Test WebP and PNG encoders produce their formats"""
+        image_file = Path(self.temp_dir) / 'color.png'
+        Image.new('RGBA', (400, 300), (255, 0, 0, 128)).save(image_file)
+        
+        for encoder, expected_format in (('webp', 'WEBP'), ('png', 'PNG'), ('jpeg-progressive', 'JPEG')):
+            result = ImageProcessor(encoder=encoder).create_thumbnail(str(image_file))
+            thumbnail = self._decode_thumbnail(result)
+            self.assertEqual(thumbnail.format, expected_format)
+            self.assertEqual(result['thumbnail_size'], (200, 150))
+            self.assertEqual(result['encoded_bytes'], len(base64.b64decode(result['thumbnail_base64'])))
+    
+    def test_max_bytes_budget(self):
+        """Test the byte budget lowers quality and then resolution"""
+        image_file = Path(self.temp_dir) / 'noise.png'
+        Image.frombytes('L', (400, 400), os.urandom(160000)).save(image_file)
+        unbounded = self.processor.create_thumbnail(str(image_file))
+        
+        budget = unbounded['encoded_bytes'] // 2
+        result = ImageProcessor(max_bytes=budget).create_thumbnail(str(image_file))
+        self.assertTrue(result['within_budget'])
+        self.assertLessEqual(result['encoded_bytes'], budget)
+        self.assertLess(result['quality'], ImageProcessor.DEFAULT_QUALITY)
+        
+        result = ImageProcessor(encoder='png', max_bytes=budget).create_thumbnail(str(image_file))
+        self.assertLessEqual(result['encoded_bytes'], budget)
+        self.assertLess(result['thumbnail_size'][0], 200)
+    
+    def test_unknown_encoder(self):
+        """Test unknown encoders are rejected"""
+        with self.assertRaises(ValueError):
+            ImageProcessor(encoder='avif')
+    
+    def test_raw_over_memory_budget_uses_banded_decode(self):
+        """Test RAW files over the budget are box-reduced from a memory map"""
+        raw_file = Path(self.temp_dir) / 'large.raw'
+        raw_data = os.urandom(1600 * 1600)
+        raw_file.write_bytes(raw_data)
+        processor = ImageProcessor(memory_budget=1024 * 1024)
+        processor.RAW_BAND_BYTES = 100000
+        
+        reduced = processor._decode_raw_banded(raw_file, 1600, 1600, 4)
+        expected = Image.frombytes('L', (1600, 1600), raw_data).reduce(4)
+        self.assertEqual(reduced.tobytes(), expected.tobytes())
+        
+        result = processor.create_thumbnail(str(raw_file))
+        self.assertTrue(result['success'])
+        self.assertEqual(result['original_size'], (1600, 1600))
+        self.assertEqual(result['thumbnail_size'], (200, 200))
+    
+    def test_jpeg_over_memory_budget_decodes_reduced(self):
+        """Test JPEGs over the budget fall back to draft (DCT-scaled) decoding"""
+        image_file = Path(self.temp_dir) / 'large.jpg'
+        Image.new('RGB', (3200, 2400), (10, 200, 30)).save(image_file)
+        timings = Timings()
+        
+        result = ImageProcessor(timings, memory_budget=4 * 1024 * 1024).create_thumbnail(str(image_file))
+        self.assertEqual(result['original_size'], (3200, 2400))
+        self.assertEqual(result['thumbnail_size'], (200, 150))
+        self.assertEqual(timings.as_dict()['counters']['reduced_decodes'], 1)
+    
+    def test_decode_budgets_reject_oversized_images(self):
+        """Test images that cannot be reduced during decode are rejected before loading"""
+        image_file = Path(self.temp_dir) / 'large.png'
+        Image.new('RGB', (2000, 2000)).save(image_file)
+        
+        with self.assertRaises(Exception) as context:
+            ImageProcessor(memory_budget=1024 * 1024).create_thumbnail(str(image_file))
+        self.assertIn('memory budget', str(context.exception))
+        
+        with self.assertRaises(Exception) as context:
+            ImageProcessor(max_pixels=1000).create_thumbnail(str(image_file))
+        self.assertIn('over the limit', str(context.exception))
+        
+        # Palette images are converted to a four-byte mode on top of the source
+        palette_file = Path(self.temp_dir) / 'palette.png'
+        Image.new('P', (2000, 2000)).save(palette_file)
+        with self.assertRaises(Exception) as context:
+            ImageProcessor(memory_budget=16 * 1024 * 1024).create_thumbnail(str(palette_file))
+        self.assertIn('memory budget', str(context.exception))
+        
+        # Pillow's hard limit is reported the same way
+        with patch.object(Image, 'MAX_IMAGE_PIXELS', 1000), self.assertRaises(Exception) as context:
+            ImageProcessor().create_thumbnail(str(image_file))
+        self.assertIn('over the limit', str(context.exception))
+    
+    def test_create_thumbnails_parallel_matches_serial(self):
+        """Test batch thumbnails through shared memory match in-process results"""
+        paths = self._write_frames(5, invalid=True)
+        
+        serial = self.processor.create_thumbnails(paths, workers=1)
+        parallel = self.processor.create_thumbnails(paths, workers=2)
+        self.assertEqual([result['path'] for result in parallel], paths)
+        for expected, actual in zip(serial, parallel):
+            self.assertEqual(expected, actual)
+        self.assertFalse(parallel[-1]['success'])
+    
+    def test_create_thumbnails_output_dir(self):
+        """Test batch thumbnails are written to the output directory"""
+        paths = self._write_frames(3)
+        output_dir = Path(self.temp_dir) / 'thumbs'
+        output_dir.mkdir()
+        
+        results = ImageProcessor(encoder='png').create_thumbnails(paths, str(output_dir), workers=2)
+        for result in results:
+            self.assertTrue(Path(result['output_path']).exists())
+            self.assertTrue(result['output_path'].endswith('.png'))
+            self.assertNotIn('thumbnail_base64', result)
+    
+    def test_create_thumbnails_missing_output_dir(self):
+        """Test an unwritable output directory fails each item instead of the batch"""
+        paths = self._write_frames(3)
+        output_dir = os.path.join(self.temp_dir, 'missing')
+        
+        for workers in (1, 2):
+            results = self.processor.create_thumbnails(paths, output_dir, workers=workers)
+            
+            self.assertEqual([result['path'] for result in results], paths)
+            self.assertFalse(any(result['success'] for result in results))
+            self.assertIn('No such file or directory', results[0]['error'])
+    
+    def test_create_thumbnails_refuses_colliding_outputs(self):
+        """Test batch outputs keep the source extension and never overwrite inputs"""
+        for name in ('a.jpg', 'a.png', 'b.jpg', 'b.jpg.jpeg'):
+            Image.new('RGB', (64, 48), color='blue').save(Path(self.temp_dir) / name)
+        paths = [str(Path(self.temp_dir) / name) for name in ('a.jpg', 'a.png', 'b.jpg', 'b.jpg.jpeg')]
+        original = Path(paths[3]).read_bytes()
+        
+        for workers in (1, 2):
+            results = self.processor.create_thumbnails(paths, self.temp_dir, workers=workers)
+            
+            self.assertTrue(results[0]['output_path'].endswith('a.jpg.jpeg'))
+            self.assertTrue(results[1]['output_path'].endswith('a.png.jpeg'))
+            self.assertFalse(results[2]['success'])
+            self.assertIn('Refusing to overwrite', results[2]['error'])
+            self.assertEqual(Path(paths[3]).read_bytes(), original)
+    
+    def test_create_preview(self):
+        """Test fast previews of standard and RAW images fit the thumbnail size"""
+        jpeg_file = Path(self.temp_dir) / 'large.jpg'
+        Image.new('RGB', (1600, 1200), color='green').save(jpeg_file)
+        raw_file = Path(self.temp_dir) / 'frame.raw'
+        raw_file.write_bytes(bytes(range(256)) * 1280)
+        
+        jpeg_preview = self.processor.create_preview(str(jpeg_file))
+        raw_preview = self.processor.create_preview(str(raw_file))
+        
+        self.assertEqual(jpeg_preview['thumbnail_size'], (200, 150))
+        self.assertEqual(jpeg_preview['original_size'], (1600, 1200))
+        self.assertEqual(raw_preview['thumbnail_size'], (200, 160))
+        self.assertEqual(raw_preview['original_size'], (640, 512))
+        preview = Image.open(io.BytesIO(base64.b64decode(raw_preview['thumbnail_base64'])))
+        self.assertEqual((preview.format, preview.mode), ('JPEG', 'L'))
+        self.assertFalse(self.processor.create_preview(os.path.join(self.temp_dir, 'missing.jpg'))['success'])
+    
+    def test_preview_raw_read_charge_counts_pages(self):
+        """Test RAW previews are charged for every page the sampled rows touch"""
+        page = mmap.PAGESIZE
+        
+        # Rows narrower than a page: the whole file is paged in
+        self.assertEqual(ImageProcessor._sampled_bytes(640, 512, 160, 327680), 327680)
+        # Page-aligned rows wider than a page: only the sampled rows
+        self.assertEqual(ImageProcessor._sampled_bytes(4 * page, 100, 10, 400 * page), 40 * page)
+    
+    def test_progressive_thumbnails(self):
+        """Test every preview is streamed before the refined thumbnails"""
+        paths = self._write_frames(3, invalid=True)
+        
+        records = list(self.processor.progressive_thumbnails(paths, workers=2))
+        
+        self.assertEqual([r['stage'] for r in records], ['preview'] * 3 + ['final'] * 4)
+        self.assertEqual([r['path'] for r in records[3:]], paths)
+        self.assertFalse(records[-1]['success'])
+        self.assertEqual(records[3]['quality'], ImageProcessor.DEFAULT_QUALITY)
+    
+    def test_progressive_thumbnail(self):
+        """Test a single image streams a preview and then the refined thumbnail"""
+        raw_file = Path(self.temp_dir) / 'frame.raw'
+        raw_file.write_bytes(b'x' * 327680)
+        output_path = str(Path(self.temp_dir) / 'thumb.jpg')
+        
+        preview, final = self.processor.progressive_thumbnail(str(raw_file), output_path)
+        
+        self.assertEqual((preview['stage'], final['stage']), ('preview', 'final'))
+        self.assertIn('thumbnail_base64', preview)
+        self.assertEqual(final['output_path'], output_path)
+    
+    def test_progressive_reads_are_charged_once(self):
+        """Test the refined pass only charges the bytes its preview did not already pay for"""
+        governor = ResourceGovernor(read_bandwidth=1e12)
+        set_governor(governor)
+        try:
+            raw_file = Path(self.temp_dir) / 'frame.raw'
+            raw_file.write_bytes(b'x' * 327680)
+            list(self.processor.progressive_thumbnail(str(raw_file)))
+            self.assertEqual(governor.drain_stats()['read_bytes'], 327680)
+            
+            paths = self._write_frames(3)
+            list(self.processor.progressive_thumbnails(paths, workers=2))
+            self.assertEqual(governor.drain_stats()['read_bytes'], 3 * 10000)
+        finally:
+            set_governor(None)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from instrumentation import Timings, NULL_TIMINGS, MetricsRegistry
+
+
+class TestTimings(unittest.TestCase):
+    
+    def test_spans_accumulate(self):
+        """Test repeated spans add up durations and call counts"""
+        timings = Timings()
+        for _ in range(3):
+            with timings.span('decode'):
+                pass
+        timings.count('bytes_read', 100)
+        timings.count('bytes_read', 50)
+        
+        report = timings.as_dict()
+        self.assertEqual(report['spans']['decode']['count'], 3)
+        self.assertGreaterEqual(report['spans']['decode']['ms'], 0)
+        self.assertEqual(report['counters'], {'bytes_read': 150})
+        self.assertIn('peak_rss_bytes', report)
+    
+    def test_span_recorded_on_error(self):
+        """Test a span is still recorded when the block raises"""
+        timings = Timings()
+        with self.assertRaises(ValueError):
+            with timings.span('encode'):
+                raise ValueError('boom')
+        self.assertEqual(timings.as_dict()['spans']['encode']['count'], 1)
+    
+    def test_concurrent_spans_and_counters(self):
+        """Test spans and counters recorded from many threads are not lost"""
+        timings = Timings()
+        
+        def work():
+            for _ in range(1000):
+                with timings.span('decode'):
+                    timings.count('bytes_read', 2)
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(8):
+                executor.submit(work)
+        
+        report = timings.as_dict()
+        self.assertEqual(report['spans']['decode']['count'], 8000)
+        self.assertEqual(report['counters'], {'bytes_read': 16000})
+    
+    def test_null_timings(self):
+        """Test the disabled stand-in accepts the same calls"""
+        with NULL_TIMINGS.span('read'):
+            pass
+        NULL_TIMINGS.count('bytes_read', 10)
+        self.assertFalse(NULL_TIMINGS.enabled)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    
+    def test_record_and_snapshot(self):
+        """Test counts, errors, histogram buckets and span totals are aggregated"""
+        registry = MetricsRegistry()
+        timings = Timings()
+        with timings.span('resize'):
+            pass
+        registry.record('thumbnail', 0.0005, timings=timings)
+        registry.record('thumbnail', 0.03)
+        registry.record('thumbnail', 20.0, error=True)
+        
+        stats = registry.snapshot()['thumbnail']
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['histogram'], {'<=1ms': 1, '<=50ms': 1, '>10000ms': 1})
+        self.assertIn('resize', stats['spans_ms'])
+        
+        registry.reset()
+        self.assertEqual(registry.snapshot(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
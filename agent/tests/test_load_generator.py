@@ -0,0 +1,65 @@
+import unittest
+import tempfile
+import argparse
+import os
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from load_generator import LoadTest, build_dataset, parse_mix, percentile
+
+
+class TestLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.dataset = build_dataset(self.temp_dir, raw_frames=4, images=2, subdirectories=2)
+    
+    def tearDown(self):
+        # Clean up temp directory
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def test_build_dataset(self):
+        """Test the synthetic dataset layout"""
+        self.assertEqual(len(self.dataset['directories']), 3)
+        self.assertEqual(len(self.dataset['files']), 6)
+        self.assertTrue(all(os.path.exists(path) for path in self.dataset['files']))
+    
+    def test_run_with_request_quota(self):
+        """Test every session issues its quota and the report aggregates it"""
+        report = LoadTest(self.dataset, sessions=3, seed=1).run(requests_per_session=4)
+        
+        self.assertEqual(report['overall']['requests'], 12)
+        self.assertEqual(report['overall']['errors'], 0)
+        self.assertEqual(sum(c['requests'] for c in report['commands'].values()), 12)
+        self.assertLessEqual(report['overall']['latency_ms']['p50'], report['overall']['latency_ms']['p99'])
+        self.assertEqual(sum(m['count'] for m in report['agent_metrics'].values()), 12)
+        for metrics in report['agent_metrics'].values():
+            self.assertTrue(metrics['spans_ms'])
+    
+    def test_run_counts_errors(self):
+        """Test failing requests are reported in the error rate"""
+        self.dataset['files'] = [os.path.join(self.temp_dir, 'missing.raw')]
+        
+        report = LoadTest(self.dataset, sessions=2, mix={'metadata': 1}).run(requests_per_session=2)
+        
+        self.assertEqual(report['overall']['error_rate'], 1.0)
+        self.assertEqual(sum(report['top_errors'].values()), 4)
+    
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+    
+    def test_parse_mix(self):
+        """Test parsing weighted command mixes"""
+        self.assertEqual(parse_mix('list=3,thumbnail'), {'list': 3, 'thumbnail': 1})
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_mix('delete=1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,11 +3,15 @@ import sys
 import os
 from unittest.mock import patch, MagicMock
 import json
+import io
+import argparse
+import subprocess
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from main import execute_command
+from main import execute_command, stream_command, run_streaming
+from instrumentation import Timings, NULL_TIMINGS, METRICS
 
 
 class TestMain(unittest.TestCase):
@@ -27,6 +31,17 @@ class TestMain(unittest.TestCase):
         mock_file_manager.list_directory.assert_called_once_with('/test/path')
         self.assertEqual(result, {'path': '/test/path', 'items': []})
     
+    @patch('main.FileManager')
+    def test_execute_command_list_with_options(self, mock_file_manager_class):
+        """Test execute_command forwards listing options"""
+        mock_file_manager = MagicMock()
+        mock_file_manager_class.return_value = mock_file_manager
+        mock_file_manager.list_directory.return_value = {'path': '/test/path', 'items': []}
+        
+        execute_command('list', '/test/path', options={'sort_by': 'natural', 'limit': 50})
+        
+        mock_file_manager.list_directory.assert_called_once_with('/test/path', sort_by='natural', limit=50)
+    
     @patch('main.ImageProcessor')
     def test_execute_command_thumbnail(self, mock_image_processor_class):
         """Test execute_command with 'thumbnail' command"""
@@ -42,6 +57,30 @@ class TestMain(unittest.TestCase):
         mock_image_processor.create_thumbnail.assert_called_once_with('/test/image.jpg', '/test/output.jpg')
         self.assertEqual(result, {'success': True, 'thumbnail_base64': 'fake_base64_data'})
     
+    @patch('main.ImageProcessor')
+    @patch('main.FileManager')
+    def test_execute_command_thumbnails(self, mock_file_manager_class, mock_image_processor_class):
+        """Test 'thumbnails' selects images by listing and batches them"""
+        mock_file_manager = mock_file_manager_class.return_value
+        mock_file_manager.list_directory.return_value = {
+            'path': '/test/path',
+            'total': 2,
+            'items': [{'type': 'directory', 'path': '/test/path/sub'},
+                      {'type': 'file', 'path': '/test/path/a.raw'}]
+        }
+        mock_image_processor = mock_image_processor_class.return_value
+        mock_image_processor.create_thumbnails.return_value = [{'success': True}]
+        
+        result = execute_command('thumbnails', '/test/path', None,
+                                 {'encoder': 'webp', 'workers': 2, 'selection': {'limit': 10}})
+        
+        _, listing_kwargs = mock_file_manager.list_directory.call_args
+        self.assertEqual(listing_kwargs['sort_by'], 'natural')
+        self.assertEqual(listing_kwargs['limit'], 10)
+        self.assertEqual(mock_image_processor_class.call_args[1], {'encoder': 'webp'})
+        mock_image_processor.create_thumbnails.assert_called_once_with(['/test/path/a.raw'], None, 2)
+        self.assertEqual(result['count'], 1)
+    
     @patch('main.FileManager')
     def test_execute_command_metadata(self, mock_file_manager_class):
         """Test execute_command with 'metadata' command"""
@@ -58,6 +97,82 @@ class TestMain(unittest.TestCase):
         mock_file_manager.get_metadata.assert_called_once_with('/test/image.jpg')
         self.assertEqual(result, {'name': 'test.jpg', 'size': 1024, 'type': 'file'})
     
+    @patch('main.SequenceProcessor')
+    def test_execute_command_sequence(self, mock_sequence_processor_class):
+        """Test execute_command with 'sequence' command"""
+        mock_sequence_processor = MagicMock()
+        mock_sequence_processor_class.return_value = mock_sequence_processor
+        mock_sequence_processor.create_preview.return_value = {'success': True}
+        
+        result = execute_command('sequence', '/test/frames', None, {'max_frames': 20})
+        
+        mock_sequence_processor.create_preview.assert_called_once_with('/test/frames', None, max_frames=20)
+        self.assertEqual(result, {'success': True})
+    
+    @patch('main.FileManager')
+    def test_execute_command_timing(self, mock_file_manager_class):
+        """Test execute_command attaches timings and records metrics"""
+        mock_file_manager = MagicMock()
+        mock_file_manager_class.return_value = mock_file_manager
+        mock_file_manager.get_metadata.return_value = {'name': 'test.jpg'}
+        METRICS.reset()
+        timings = Timings()
+        
+        result = execute_command('metadata', '/test/image.jpg', timings=timings)
+        
+        mock_file_manager_class.assert_called_once_with(timings)
+        self.assertIn('total_ms', result['timing'])
+        self.assertEqual(METRICS.snapshot()['metadata']['count'], 1)
+    
+    @patch('main.ManifestBuilder')
+    def test_stream_command_manifest(self, mock_manifest_builder_class):
+        """Test stream_command yields manifest records and a final timing record"""
+        records = [{'type': 'header'}, {'type': 'file', 'path': 'a.raw'}, {'type': 'summary'}]
+        mock_manifest_builder_class.return_value.build.return_value = iter(records)
+        METRICS.reset()
+        
+        streamed = list(stream_command('manifest', '/test/dir', {'hash_algorithm': 'sha256'}, Timings()))
+        
+        mock_manifest_builder_class.return_value.build.assert_called_once_with('/test/dir', hash_algorithm='sha256')
+        self.assertEqual(streamed[:-1], records)
+        self.assertEqual(streamed[-1]['type'], 'timing')
+        self.assertEqual(METRICS.snapshot()['manifest']['count'], 1)
+    
+    @patch('main.ImageProcessor')
+    def test_stream_command_progressive_thumbnail(self, mock_image_processor_class):
+        """Test thumbnail commands stream progressively with the given output"""
+        records = [{'stage': 'preview'}, {'stage': 'final'}]
+        mock_image_processor_class.return_value.progressive_thumbnail.return_value = iter(records)
+        
+        streamed = list(stream_command('thumbnail', '/test/image.jpg', {'quality': 70}, output='/tmp/t.jpg'))
+        
+        mock_image_processor_class.assert_called_once_with(NULL_TIMINGS, quality=70)
+        mock_image_processor_class.return_value.progressive_thumbnail.assert_called_once_with(
+            '/test/image.jpg', '/tmp/t.jpg')
+        self.assertEqual(streamed, records)
+    
+    @patch('main.build_options', return_value={})
+    @patch('main.stream_command')
+    def test_run_streaming_progressive_thumbnail_failure(self, mock_stream_command, mock_build_options):
+        """Test a failed progressive thumbnail exits non-zero after streaming its records"""
+        mock_stream_command.return_value = iter([
+            {'stage': 'final', 'success': False, 'error': 'Image file not found'}])
+        args = argparse.Namespace(command='thumbnail', path='/missing.jpg', output=None,
+                                  timing=False, metrics_file=None)
+        
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout, patch('sys.stderr', new_callable=io.StringIO):
+            code = run_streaming(args, None)
+        
+        self.assertEqual(code, 1)
+        self.assertFalse(json.loads(stdout.getvalue())['success'])
+    
+    def test_import_does_not_load_numpy(self):
+        """Test numpy is only imported by commands that need it"""
+        src = os.path.join(os.path.dirname(__file__), '..', 'src')
+        completed = subprocess.run([sys.executable, '-c', "import sys, main; print('numpy' in sys.modules)"],
+                                   cwd=src, capture_output=True, text=True, check=True)
+        self.assertEqual(completed.stdout.strip(), 'False')
+    
     def test_execute_command_unknown(self):
         """Test execute_command with unknown command"""
         with self.assertRaises(ValueError) as context:
@@ -0,0 +1,92 @@
+import unittest
+import tempfile
+import hashlib
+import json
+import os
+from pathlib import Path
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from manifest import ManifestBuilder
+
+
+class TestManifestBuilder(unittest.TestCase):
+    def setUp(self):
+        self.builder = ManifestBuilder(max_workers=2)
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = Path(self.temp_dir) / 'tree'
+        (self.root / 'sub').mkdir(parents=True)
+        (self.root / 'a.raw').write_bytes(b'a' * 100)
+        (self.root / 'b.raw').write_bytes(b'b' * 200)
+        (self.root / 'sub' / 'c.txt').write_bytes(b'c')
+    
+    def tearDown(self):
+        # Clean up temp directory
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def _write_manifest(self, records):
+        manifest_path = Path(self.temp_dir) / 'previous.ndjson'
+        manifest_path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+        return str(manifest_path)
+    
+    def test_build_manifest(self):
+        """Test records are a header, files in walk order and a summary"""
+        records = list(self.builder.build(str(self.root)))
+        
+        self.assertEqual(records[0]['type'], 'header')
+        self.assertIsNone(records[0]['hash_algorithm'])
+        self.assertEqual([r['path'] for r in records[1:-1]], ['a.raw', 'b.raw', 'sub/c.txt'])
+        self.assertNotIn('hash', records[1])
+        self.assertEqual(records[-1], {'type': 'summary', 'files': 3, 'bytes': 301,
+                                       'hashed_bytes': 0, 'errors': 0})
+    
+    def test_build_manifest_with_hash(self):
+        """Test file hashes match hashlib"""
+        records = list(self.builder.build(str(self.root), hash_algorithm='sha256'))
+        
+        self.assertEqual(records[1]['hash'], hashlib.sha256(b'a' * 100).hexdigest())
+        self.assertEqual(records[3]['hash'], hashlib.sha256(b'c').hexdigest())
+        self.assertEqual(records[-1]['hashed_bytes'], 301)
+    
+    def test_build_manifest_diff(self):
+        """Test diffing reports added, modified and removed files"""
+        previous = list(self.builder.build(str(self.root)))
+        manifest_path = self._write_manifest(previous)
+        (self.root / 'b.raw').write_bytes(b'b' * 201)
+        (self.root / 'sub' / 'c.txt').unlink()
+        (self.root / 'd.raw').write_bytes(b'd')
+        
+        records = list(self.builder.build(str(self.root), previous_manifest=manifest_path))
+        statuses = {r['path']: r['status'] for r in records[1:-1]}
+        
+        self.assertEqual(statuses, {'b.raw': 'modified', 'd.raw': 'added', 'sub/c.txt': 'removed'})
+        self.assertEqual(records[-1]['unchanged'], 1)
+    
+    def test_build_manifest_diff_reuses_hashes(self):
+        """Test unchanged files are not hashed again"""
+        previous = list(self.builder.build(str(self.root), hash_algorithm='blake2b'))
+        manifest_path = self._write_manifest(previous)
+        
+        records = list(self.builder.build(str(self.root), hash_algorithm='blake2b',
+                                          previous_manifest=manifest_path, include_unchanged=True))
+        
+        self.assertEqual([r['status'] for r in records[1:-1]], ['unchanged'] * 3)
+        self.assertEqual(records[1]['hash'], previous[1]['hash'])
+        self.assertEqual(records[-1]['hashed_bytes'], 0)
+    
+    def test_build_manifest_unknown_algorithm(self):
+        """Test an unsupported hash algorithm is rejected"""
+        with self.assertRaises(ValueError):
+            list(self.builder.build(str(self.root), hash_algorithm='crc32'))
+    
+    def test_build_manifest_nonexistent(self):
+        """Test building a manifest of a missing directory"""
+        with self.assertRaises(FileNotFoundError):
+            list(self.builder.build(os.path.join(self.temp_dir, 'missing')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+import tempfile
+import threading
+import time
+import os
+import sys
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from resource_governor import ResourceGovernor, TokenBucket, get_governor, set_governor, bounded_map
+from main import execute_command
+
+
+class TestResourceGovernor(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        set_governor(None)
+        # Clean up temp directory
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def test_token_bucket_paces_consumption(self):
+        """Test consumption beyond the burst waits for the deficit"""
+        bucket = TokenBucket(rate=1000, burst=100)
+        
+        self.assertEqual(bucket.consume(100), 0.0)
+        waited = bucket.consume(50)
+        
+        self.assertAlmostEqual(waited, 0.05, delta=0.01)
+    
+    def test_throttle_read_records_wait(self):
+        """Test reads over the bandwidth limit are counted as throttled"""
+        governor = ResourceGovernor(read_bandwidth=10000)
+        
+        start = time.monotonic()
+        governor.throttle_read(10000)
+        governor.throttle_read(1000)
+        
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        stats = governor.stats()
+        self.assertEqual(stats['read_bytes'], 11000)
+        self.assertGreater(stats['read_wait_ms'], 0)
+    
+    def test_worker_limit(self):
+        """Test pool sizes are capped at max_workers"""
+        governor = ResourceGovernor(max_workers=2)
+        
+        self.assertEqual(governor.worker_limit(8), 2)
+        self.assertEqual(governor.worker_limit(1), 1)
+        self.assertEqual(governor.stats()['workers_capped'], 1)
+        self.assertEqual(ResourceGovernor().worker_limit(8), 8)
+    
+    def test_pool_size(self):
+        """Test pool sizes default to a multiple of the CPU count and honour max_workers"""
+        with patch('os.cpu_count', return_value=2):
+            self.assertEqual(ResourceGovernor().pool_size(), 2)
+            self.assertEqual(ResourceGovernor().pool_size(per_cpu=2), 4)
+            self.assertEqual(ResourceGovernor().pool_size(per_cpu=8), ResourceGovernor.DEFAULT_POOL_SIZE)
+            self.assertEqual(ResourceGovernor().pool_size(16), 16)
+            self.assertEqual(ResourceGovernor(max_workers=3).pool_size(16), 3)
+    
+    def test_bounded_map_keeps_order_and_bound(self):
+        """Test results come back in input order with at most limit items submitted ahead"""
+        submitted = []
+        yielded = []
+        
+        def submit(item):
+            # Items are never more than limit ahead of the last one yielded
+            self.assertLessEqual(len(submitted) - len(yielded), 3)
+            submitted.append(item)
+            return executor.submit(time.sleep, 0.001 * (5 - item % 5)) if item % 2 else item * 10
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for item, result in bounded_map(submit, range(20), 3):
+                yielded.append(item)
+                self.assertEqual(result, None if item % 2 else item * 10)
+        
+        self.assertEqual(yielded, list(range(20)))
+    
+    def test_worker_settings_share_bandwidth(self):
+        """Test pool workers get an equal share of the read bandwidth"""
+        settings = ResourceGovernor(read_bandwidth=1000, max_in_flight=2).worker_settings(4)
+        
+        self.assertEqual(settings['read_bandwidth'], 250)
+        self.assertNotIn('max_in_flight', settings)
+    
+    def test_request_slots(self):
+        """Test requests beyond max_in_flight wait and time out"""
+        governor = ResourceGovernor(max_in_flight=1, slot_dir=self.temp_dir, slot_timeout=0.1)
+        held = threading.Event()
+        done = threading.Event()
+        
+        def hold():
+            with governor.request():
+                held.set()
+                done.wait()
+        
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        with self.assertRaises(TimeoutError):
+            with governor.request():
+                pass
+        done.set()
+        thread.join()
+        
+        with governor.request():
+            pass
+        self.assertEqual(governor.stats()['slots_timed_out'], 1)
+    
+    def test_from_environment(self):
+        """Test limits are read from the environment and overridden by arguments"""
+        environment = {'RRV_AGENT_MAX_WORKERS': '3', 'RRV_AGENT_IONICE': 'idle'}
+        with patch.dict(os.environ, environment):
+            governor = ResourceGovernor.from_environment(max_workers=2)
+        
+        self.assertEqual(governor.max_workers, 2)
+        self.assertEqual(governor.ionice, 'idle')
+        self.assertTrue(governor.enabled)
+        with patch.dict(os.environ, {'RRV_AGENT_MAX_IN_FLIGHT': 'many'}):
+            with self.assertRaises(ValueError):
+                ResourceGovernor.from_environment()
+    
+    def test_execute_command_reports_throttling(self):
+        """Test execute_command runs under the governor and reports throttling"""
+        set_governor(ResourceGovernor(max_in_flight=2, slot_dir=self.temp_dir))
+        
+        result = execute_command('list', self.temp_dir)
+        
+        self.assertEqual(result['throttling']['limits']['max_in_flight'], 2)
+        self.assertIn('slot_wait_ms', result['throttling'])
+        set_governor(ResourceGovernor())
+        self.assertNotIn('throttling', execute_command('list', self.temp_dir))
+        self.assertFalse(get_governor().enabled)
+    
+    def test_execute_command_uses_environment_without_main(self):
+        """Test embedded execute_command calls pick up RRV_AGENT_* limits"""
+        environment = {'RRV_AGENT_MAX_IN_FLIGHT': '3', 'RRV_AGENT_SLOT_DIR': self.temp_dir}
+        with patch.dict(os.environ, environment):
+            set_governor(None)
+            result = execute_command('list', self.temp_dir)
+        
+        self.assertEqual(result['throttling']['limits']['max_in_flight'], 3)
+        self.assertEqual(get_governor().slot_dir, self.temp_dir)
+    
+    def test_invalid_environment_is_reported(self):
+        """Test a bad RRV_AGENT_* value fails the call instead of disabling limits"""
+        with patch.dict(os.environ, {'RRV_AGENT_MAX_WORKERS': 'lots'}):
+            set_governor(None)
+            with self.assertRaises(ValueError) as context:
+                execute_command('list', self.temp_dir)
+        
+        self.assertIn('RRV_AGENT_MAX_WORKERS', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import tempfile
+import os
+import io
+import base64
+from pathlib import Path
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image
+from sequence_processor import SequenceProcessor
+
+
+class TestSequenceProcessor(unittest.TestCase):
+    def setUp(self):
+        self.processor = SequenceProcessor(max_workers=2)
+        self.temp_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        # Clean up temp directory
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def _write_frames(self, names, size=10000):
+        for index, name in enumerate(names):
+            (Path(self.temp_dir) / name).write_bytes(bytes([index % 256]) * size)
+    
+    def test_detect_sequences(self):
+        """Test numbered files are grouped into sequences with gaps reported"""
+        self._write_frames([f'frame_{i:06d}.raw' for i in (1, 2, 3, 5)])
+        self._write_frames(['shot_9.raw', 'shot_10.raw', 'single_1.raw', 'notes_1.txt', 'notes_2.txt'])
+        
+        sequences = self.processor.detect_sequences(self.temp_dir)
+        self.assertEqual([seq['id'] for seq in sequences], ['frame_%06d.raw', 'shot_%d.raw'])
+        self.assertEqual(sequences[0]['count'], 4)
+        self.assertEqual(sequences[0]['missing'], 1)
+        self.assertEqual(sequences[1]['frames'], ['shot_9.raw', 'shot_10.raw'])
+    
+    def test_sample_frames(self):
+        """Test even sampling and explicit step"""
+        frames = [str(i) for i in range(10)]
+        self.assertEqual(self.processor._sample_frames(frames, 5, None), ['0', '2', '4', '6', '8'])
+        self.assertEqual(self.processor._sample_frames(frames, 3, 4), ['0', '4', '8'])
+        self.assertEqual(self.processor._sample_frames(frames, 20, None), frames)
+    
+    def test_create_preview_gif(self):
+        """Test an animated GIF preview is rendered from RAW frames"""
+        self._write_frames([f'frame_{i:04d}.raw' for i in range(12)], size=327680)
+        
+        result = self.processor.create_preview(self.temp_dir, max_frames=4, buffer_frames=2)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['frame_count'], 4)
+        self.assertEqual(result['frame_size'], (200, 160))
+        
+        clip = Image.open(io.BytesIO(base64.b64decode(result['preview_base64'])))
+        self.assertEqual(clip.format, 'GIF')
+        self.assertEqual(clip.n_frames, 4)
+    
+    def test_create_preview_skips_invalid_frames(self):
+        """Test undecodable frames are skipped rather than failing the clip"""
+        self._write_frames(['frame_1.raw', 'frame_2.raw'])
+        self._write_frames(['frame_3.raw'], size=1234)
+        output = Path(self.temp_dir) / 'preview.gif'
+        
+        result = self.processor.create_preview(self.temp_dir, str(output))
+        self.assertEqual(result['frame_count'], 2)
+        self.assertEqual(result['skipped_frames'], 1)
+        self.assertTrue(output.exists())
+    
+    def test_create_preview_unknown_sequence(self):
+        """Test requesting a missing sequence fails"""
+        self._write_frames(['frame_1.raw', 'frame_2.raw'])
+        with self.assertRaises(Exception) as context:
+            self.processor.create_preview(self.temp_dir, sequence_id='other_%d.raw')
+        self.assertIn('Sequence not found', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
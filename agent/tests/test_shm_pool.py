@@ -0,0 +1,48 @@
+import unittest
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from shm_pool import SharedBufferPool, attach_slab
+
+
+def _fill_slab(name, value, length):
+    attach_slab(name)[:length] = bytes([value]) * length
+    return length
+
+
+class TestSharedBufferPool(unittest.TestCase):
+    
+    def test_acquire_and_release_recycles_slabs(self):
+        """Test slabs are handed out once and recycled after release"""
+        with SharedBufferPool(1024, 2) as pool:
+            first = pool.acquire()
+            second = pool.acquire()
+            self.assertNotEqual(first, second)
+            self.assertEqual(set(pool.names), {first, second})
+            
+            pool.release(first)
+            self.assertEqual(pool.acquire(timeout=1), first)
+            with self.assertRaises(KeyError):
+                pool.release('not-a-slab')
+    
+    def test_worker_writes_are_visible(self):
+        """Test a worker process writes into a slab read back without pickling the data"""
+        with SharedBufferPool(4096, 1) as pool, ProcessPoolExecutor(max_workers=1) as executor:
+            slab = pool.acquire()
+            length = executor.submit(_fill_slab, slab, 7, 3000).result()
+            view = pool.view(slab, length)
+            self.assertEqual(bytes(view), bytes([7]) * 3000)
+            view.release()
+    
+    def test_invalid_sizes(self):
+        """Test empty pools are rejected"""
+        with self.assertRaises(ValueError):
+            SharedBufferPool(0, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()